@@ -1,17 +1,28 @@
+import atexit
+import math
 import os
 import re
 import sqlite3
-import random
+import string
+import threading
+import secrets
 import time
 import csv
-from datetime import datetime, date
-from typing import List, Any, Optional, Dict, Tuple
-
+import hmac
+import json
+from collections import deque
+from contextlib import closing, contextmanager
+from datetime import datetime, date, timezone
+from typing import List, Any, Optional, Dict, Iterator, Tuple
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
 from dateutil import parser as dtparser
 import requests
+from requests.adapters import HTTPAdapter
 
 # -------------------------------------------------------------
 # BASIC CONFIG
@@ -21,10 +32,17 @@ APP_TITLE = "Radom CRM"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_FILE = os.path.join(DATA_DIR, "radom_crm.db")
-BACKUP_FILE = os.path.join(DATA_DIR, "contacts_backup.csv")
+BACKUP_FILE = os.path.join(DATA_DIR, "contacts_backup.parquet")
+LEGACY_BACKUP_CSV = os.path.join(DATA_DIR, "contacts_backup.csv")  # read on restore if no parquet yet
 
 DEFAULT_PASSWORD = "CatJorge"
 OTP_TTL_SECONDS = 300  # 5 minutes
+OTP_RESEND_MIN_INTERVAL = 10  # seconds between code sends per session
+TG_LONG_POLL_SECONDS = 25  # how long Telegram may hold a getUpdates request open
+TG_UPDATES_RETRY_SECONDS = 5  # first back-off after a failed getUpdates poll, doubled per failure
+TG_UPDATES_MAX_RETRY_SECONDS = 300  # back-off cap while getUpdates keeps failing
+TG_RECENT_UPDATES = 50  # raw updates kept for the troubleshooting view
+BACKUP_MIN_INTERVAL = 60  # seconds between contacts backup snapshots
 
 APPLICATIONS = sorted(
     [
@@ -47,6 +65,12 @@ APPLICATIONS = sorted(
 
 PRODUCTS = ["1 kW", "10 kW", "100 kW", "1 MW"]
 
+# editor selectbox options ("" = not set) with value -> index lookups
+APPLICATION_OPTIONS = [""] + APPLICATIONS
+APPLICATION_OPTIONS_IDX = {s: i for i, s in enumerate(APPLICATION_OPTIONS)}
+PRODUCT_OPTIONS = [""] + PRODUCTS
+PRODUCT_OPTIONS_IDX = {s: i for i, s in enumerate(PRODUCT_OPTIONS)}
+
 PIPELINE = [
     "New",
     "Contacted",
@@ -59,8 +83,22 @@ PIPELINE = [
     "On hold",
     "Irrelevant",
 ]
+PIPELINE_IDX = {s: i for i, s in enumerate(PIPELINE)}
+# customer-overview panels; statuses not listed here (Won, Lost, Nurture) get no panel
+OVERVIEW_BUCKETS = {
+    "hot": ("Quoted", "Meeting"),
+    "pot": ("New", "Contacted"),
+    "cold": ("Pending", "On hold", "Irrelevant"),
+}
+
+CATEGORIES = ["PhD/Student", "Professor/Academic", "Academic", "Industry", "Other"]
 
 OWNERS = ["", "Velibor", "Liz", "Jovan", "Ian", "Qi", "Kenshin"]
+OWNERS_IDX = {s: i for i, s in enumerate(OWNERS)}
+
+PAGE_SIZE = 200  # rows per page in the contacts table
+IMPORT_CHUNK_ROWS = 5000  # CSV rows read + upserted per batch
+STR_DTYPE = pd.StringDtype("pyarrow")  # nullable text for the vectorized cleaners; pyarrow ships with streamlit
 
 # -------------------------------------------------------------
 # dtype-safe numeric helpers
@@ -73,6 +111,39 @@ def safe_float_series(s: pd.Series, default: float = 0.0) -> pd.Series:
     return pd.to_numeric(s, errors="coerce").fillna(default).astype("float64")
 
 
+# -------------------------------------------------------------
+# TIMESTAMPS (notes.ts / status_history.ts are INTEGER unix-ms)
+# -------------------------------------------------------------
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _to_epoch_ms(v: Any) -> Optional[int]:
+    if v is None:
+        return None
+    s = str(v).strip()
+    if not s:
+        return None
+    try:
+        dt = dtparser.parse(s)
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _ms_to_datetime(v: Any) -> Optional[datetime]:
+    ms = pd.to_numeric(v, errors="coerce")
+    if ms is None or pd.isna(ms):
+        return None
+    return datetime.fromtimestamp(float(ms) / 1000.0, tz=timezone.utc).replace(tzinfo=None)
+
+
+def ms_series_to_text(s: pd.Series, fmt: str = "%Y-%m-%d %H:%M:%S") -> pd.Series:
+    return pd.to_datetime(pd.to_numeric(s, errors="coerce"), unit="ms").dt.strftime(fmt).fillna("")
+
+
 # -------------------------------------------------------------
 # NOTES IMPORT sanitize + trim email threads
 # -------------------------------------------------------------
@@ -111,14 +182,46 @@ def sanitize_note_text(v: Any, *, trim_email_threads: bool = True, max_len: int
 # DB
 # -------------------------------------------------------------
 def get_conn() -> sqlite3.Connection:
+    # one connection per browser session, reused across its reruns (pragmas + page cache stay warm).
+    # Sessions never share it: each keeps its own transactions, temp staging tables and commits.
+    conn = st.session_state.get("_db_conn")
+    if conn is None:
+        conn = st.session_state["_db_conn"] = _open_conn()
+    return conn
+
+
+def _open_conn() -> sqlite3.Connection:
     os.makedirs(DATA_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    # reruns run on fresh script threads, hence check_same_thread=False; only this session uses it.
+    # Bigger statement cache: the filter/import/status SQL is fixed text, so it is compiled once
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, cached_statements=256)
     conn.execute("PRAGMA foreign_keys = ON;")
     conn.execute("PRAGMA journal_mode=WAL;")
+    # WAL only needs to fsync at checkpoints; staging tables for imports stay in RAM
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-65536;")  # 64 MiB
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB
     conn.execute("PRAGMA busy_timeout=5000;")
     return conn
 
 
+@contextmanager
+def write_txn(conn: sqlite3.Connection):
+    # BEGIN IMMEDIATE grabs the write lock once; everything inside shares a single commit.
+    # Nested use joins the outer transaction (the connection is per session, so it is always ours).
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
 def _table_cols(conn: sqlite3.Connection, table: str) -> List[str]:
     return [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
 
@@ -145,6 +248,93 @@ def _backfill_unit_price_cents(conn: sqlite3.Connection):
         conn.commit()
 
 
+_EPOCH_MS_TABLES = {
+    "notes": """
+        CREATE TABLE notes__new (
+          id INTEGER PRIMARY KEY,
+          contact_id INTEGER,
+          ts INTEGER,
+          body TEXT,
+          next_followup TEXT,
+          FOREIGN KEY(contact_id) REFERENCES contacts(id) ON DELETE CASCADE
+        )
+    """,
+    "status_history": """
+        CREATE TABLE status_history__new (
+          id INTEGER PRIMARY KEY,
+          contact_id INTEGER,
+          ts INTEGER,
+          old_status TEXT,
+          new_status TEXT,
+          FOREIGN KEY(contact_id) REFERENCES contacts(id) ON DELETE CASCADE
+        )
+    """,
+}
+
+
+def _migrate_ts_to_epoch_ms(conn: sqlite3.Connection):
+    # Older DBs declared ts as TEXT (ISO strings). TEXT affinity would store ints as text again,
+    # so rebuild the table with an INTEGER column and convert the ISO values once.
+    for table, ddl in _EPOCH_MS_TABLES.items():
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        ts_type = next(((r[2] or "").upper() for r in info if r[1] == "ts"), "")
+        if ts_type == "INTEGER":
+            continue
+        cols = [r[1] for r in info if r[1] != "ts"]
+        with write_txn(conn):
+            conn.execute(f"DROP TABLE IF EXISTS {table}__new")
+            conn.execute(ddl)
+            conn.execute(
+                f"""
+                INSERT INTO {table}__new({", ".join(cols)}, ts)
+                SELECT {", ".join(cols)}, CAST(ROUND((julianday(ts) - 2440587.5) * 86400000.0) AS INTEGER)
+                FROM {table}
+                """
+            )
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+
+
+# substring search over these columns goes through a trigram FTS5 index (needs >= 3 chars)
+FTS_COLS = ["first_name", "last_name", "email", "company"]
+
+
+def _ensure_contacts_fts(conn: sqlite3.Connection):
+    # external-content table: the index lives in contacts_fts, the text stays in contacts
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='contacts_fts'").fetchone():
+        return
+    cols = ", ".join(FTS_COLS)
+    new_vals = ", ".join(f"new.{c}" for c in FTS_COLS)
+    old_vals = ", ".join(f"old.{c}" for c in FTS_COLS)
+    with write_txn(conn):
+        conn.execute(
+            f"CREATE VIRTUAL TABLE contacts_fts USING fts5({cols}, content='contacts', content_rowid='id', tokenize='trigram')"
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+              INSERT INTO contacts_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+              INSERT INTO contacts_fts(contacts_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF {cols} ON contacts BEGIN
+              INSERT INTO contacts_fts(contacts_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+              INSERT INTO contacts_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+            END
+            """
+        )
+        conn.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
 def init_db(conn: sqlite3.Connection):
     conn.executescript(
         """
@@ -179,7 +369,7 @@ def init_db(conn: sqlite3.Connection):
         CREATE TABLE IF NOT EXISTS notes (
           id INTEGER PRIMARY KEY,
           contact_id INTEGER,
-          ts TEXT,
+          ts INTEGER,
           body TEXT,
           next_followup TEXT,
           FOREIGN KEY(contact_id) REFERENCES contacts(id) ON DELETE CASCADE
@@ -188,7 +378,7 @@ def init_db(conn: sqlite3.Connection):
         CREATE TABLE IF NOT EXISTS status_history (
           id INTEGER PRIMARY KEY,
           contact_id INTEGER,
-          ts TEXT,
+          ts INTEGER,
           old_status TEXT,
           new_status TEXT,
           FOREIGN KEY(contact_id) REFERENCES contacts(id) ON DELETE CASCADE
@@ -243,6 +433,21 @@ def init_db(conn: sqlite3.Connection):
     )
 
     _backfill_unit_price_cents(conn)
+    _migrate_ts_to_epoch_ms(conn)
+
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_notes_contact ON notes(contact_id, ts);
+        CREATE INDEX IF NOT EXISTS idx_contacts_status ON contacts(status);
+        CREATE INDEX IF NOT EXISTS idx_contacts_category ON contacts(category);
+        CREATE INDEX IF NOT EXISTS idx_contacts_application ON contacts(application);
+        CREATE INDEX IF NOT EXISTS idx_contacts_product ON contacts(product_interest);
+        CREATE INDEX IF NOT EXISTS idx_contacts_email ON contacts(email);
+        CREATE INDEX IF NOT EXISTS idx_contacts_profile ON contacts(lower(profile_url));
+        CREATE INDEX IF NOT EXISTS idx_sales_contact ON sales(contact_id);
+        """
+    )
+    _ensure_contacts_fts(conn)
 
 
 # -------------------------------------------------------------
@@ -368,17 +573,17 @@ _COUNTRY_TO_ISO2 = {
 }
 
 
+# lowercased country text -> ISO2; bare two-letter codes win over aliases, so "uk" stays "UK"
+_FLAG_ISO2 = {
+    **_COUNTRY_TO_ISO2,
+    **{a + b: (a + b).upper() for a in string.ascii_lowercase for b in string.ascii_lowercase},
+}
+
+
 def flag_img(country: Any, size: int = 18) -> str:
     if country is None:
         return ""
-    s = str(country).strip()
-    if not s:
-        return ""
-    iso = ""
-    if len(s) == 2 and s.isalpha():
-        iso = s.upper()
-    else:
-        iso = _COUNTRY_TO_ISO2.get(s.lower(), "")
+    iso = _FLAG_ISO2.get(str(country).strip().lower(), "")
     if not iso:
         return ""
     return (
@@ -450,6 +655,14 @@ def _tg_token() -> str:
         return ""
 
 
+@st.cache_resource(show_spinner=False)
+def _tg_session() -> requests.Session:
+    # pooled keep-alive session: later Telegram calls skip the TCP + TLS handshake
+    session = requests.Session()
+    session.mount("https://api.telegram.org", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=1))
+    return session
+
+
 def _tg_api(method: str) -> str:
     token = _tg_token()
     return f"https://api.telegram.org/bot{token}/{method}"
@@ -460,21 +673,127 @@ def telegram_get_me() -> Tuple[int, str]:
     if not token:
         return 0, "Missing TELEGRAM_BOT_TOKEN in secrets."
     try:
-        r = requests.get(_tg_api("getMe"), timeout=10)
+        r = _tg_session().get(_tg_api("getMe"), timeout=10)
         return r.status_code, r.text
     except Exception as e:
         return 0, str(e)
 
 
 def telegram_get_updates() -> Tuple[int, str]:
+    # served from the listener: a getUpdates call of our own would cut its long poll short (409)
+    # and could only ever return updates the listener hasn't acknowledged yet
     token = _tg_token()
     if not token:
         return 0, "Missing TELEGRAM_BOT_TOKEN in secrets."
-    try:
-        r = requests.get(_tg_api("getUpdates"), params={"limit": 50}, timeout=15)
-        return r.status_code, r.text
-    except Exception as e:
-        return 0, str(e)
+    idx = _tg_chat_index(token)
+    idx["ready"].wait(15)
+    with idx["lock"]:
+        body = {"ok": idx["error"] is None, "result": list(idx["recent"])}
+        if idx["error"] is not None:
+            body["description"] = idx["error"]
+        return idx["status"], json.dumps(body, indent=2, ensure_ascii=False)
+
+
+def _tg_store_chats(seen: Dict[str, int]):
+    # acknowledged updates won't come back from Telegram, so keep every mapping we saw.
+    # Own connection: this runs on the listener thread, outside any session's write_txn.
+    now = datetime.utcnow().isoformat()
+    with closing(sqlite3.connect(DB_FILE, timeout=5)) as c:
+        c.executemany(
+            "INSERT OR REPLACE INTO telegram_users(username, chat_id, first_seen) VALUES (?,?,?)",
+            [(u, cid, now) for u, cid in seen.items()],
+        )
+        c.commit()
+
+
+def _tg_listen_updates(token: str, idx: Dict[str, Any]):
+    # long poll: Telegram holds the request until something arrives, so a user's "Start"
+    # is indexed about one RTT later and logins never wait on getUpdates themselves
+    url = f"https://api.telegram.org/bot{token}/getUpdates"
+    session = requests.Session()
+    wait = 0  # first poll returns the pending backlog right away
+    retry = TG_UPDATES_RETRY_SECONDS
+    while True:
+        status = 0
+        try:
+            resp = session.get(
+                url,
+                params={"offset": idx["offset"], "limit": 100, "timeout": wait},
+                timeout=wait + 15,
+            )
+            status = resp.status_code
+            try:
+                data = resp.json()
+            except ValueError:
+                data = {}
+            if not data.get("ok"):
+                raise RuntimeError(data.get("description") or f"HTTP {status}")
+
+            seen: Dict[str, int] = {}
+            for upd in data.get("result", []):
+                # offset acknowledges what we've already indexed, so each poll only returns new updates
+                idx["offset"] = max(idx["offset"], int(upd.get("update_id", 0)) + 1)
+                msg = upd.get("message") or upd.get("edited_message")
+                if not msg:
+                    continue
+                chat = msg.get("chat") or {}
+                if chat.get("type") != "private" or chat.get("id") is None:
+                    continue
+                frm = msg.get("from") or {}
+                for u in (frm.get("username"), chat.get("username")):
+                    u = (u or "").strip().lstrip("@").lower()
+                    if u:
+                        seen[u] = int(chat["id"])
+
+            with idx["lock"]:
+                idx["chats"].update(seen)
+                idx["recent"].extend(data.get("result", []))
+                if idx["error"] is not None:
+                    print("Telegram getUpdates recovered")
+                idx["status"], idx["error"] = status, None
+            if seen:
+                _tg_store_chats(seen)
+            wait = TG_LONG_POLL_SECONDS
+            retry = TG_UPDATES_RETRY_SECONDS
+        except Exception as e:
+            err = str(e)
+            with idx["lock"]:
+                # log state changes only; a lasting failure would otherwise print on every retry
+                if err != idx["error"]:
+                    print(f"Telegram getUpdates failed: {err}")
+                idx["status"], idx["error"] = status, err
+            if status in (401, 404):
+                # revoked or malformed token: it won't start working again for this listener
+                print("Telegram getUpdates listener stopped: the bot token was rejected")
+                return
+            time.sleep(retry)
+            retry = min(retry * 2, TG_UPDATES_MAX_RETRY_SECONDS)
+        finally:
+            idx["ready"].set()
+
+
+@st.cache_resource(show_spinner=False)
+def _tg_chat_index(token: str) -> Dict[str, Any]:
+    # per-bot, process-wide: username -> private chat id, kept current by a listener thread
+    idx = {
+        "lock": threading.Lock(),
+        "ready": threading.Event(),
+        "offset": 0,
+        "chats": {},
+        "recent": deque(maxlen=TG_RECENT_UPDATES),
+        "status": 0,
+        "error": None,
+    }
+    threading.Thread(target=_tg_listen_updates, args=(token, idx), name="telegram-updates", daemon=True).start()
+    return idx
+
+
+def _tg_private_chats(token: str) -> Dict[str, int]:
+    idx = _tg_chat_index(token)
+    # only the very first lookup after startup waits, for the backlog poll to land
+    idx["ready"].wait(15)
+    with idx["lock"]:
+        return dict(idx["chats"])
 
 
 def telegram_find_chat_id_by_username(username: str) -> Optional[int]:
@@ -491,7 +810,7 @@ def telegram_find_chat_id_by_username(username: str) -> Optional[int]:
 
     try:
         conn = get_conn()
-        init_db(conn)
+        prepare_db(conn)
         row = conn.execute(
             "SELECT chat_id FROM telegram_users WHERE lower(username)=?",
             (username.lower(),),
@@ -503,38 +822,9 @@ def telegram_find_chat_id_by_username(username: str) -> Optional[int]:
         pass
 
     try:
-        resp = requests.get(_tg_api("getUpdates"), params={"limit": 100}, timeout=15)
-        if resp.status_code != 200:
-            return None
-        data = resp.json()
-        if not data.get("ok"):
-            return None
-
-        best: Optional[int] = None
-        for upd in data.get("result", []):
-            msg = upd.get("message") or upd.get("edited_message")
-            if not msg:
-                continue
-            chat = msg.get("chat") or {}
-            frm = msg.get("from") or {}
-            u1 = (frm.get("username") or "").strip().lstrip("@")
-            u2 = (chat.get("username") or "").strip().lstrip("@")
-            if u1.lower() == username.lower() or u2.lower() == username.lower():
-                if chat.get("type") == "private" and chat.get("id") is not None:
-                    best = int(chat["id"])
-
+        best = _tg_private_chats(token).get(username.lower())
         if best is not None:
             cache[username.lower()] = best
-            try:
-                conn = get_conn()
-                init_db(conn)
-                conn.execute(
-                    "INSERT OR REPLACE INTO telegram_users(username, chat_id, first_seen) VALUES (?,?,?)",
-                    (username.lower(), int(best), datetime.utcnow().isoformat()),
-                )
-                conn.commit()
-            except Exception:
-                pass
             return best
 
     except Exception:
@@ -547,7 +837,7 @@ def telegram_send_message(chat_id: int, text: str) -> Tuple[bool, str]:
     if not token:
         return False, "Missing TELEGRAM_BOT_TOKEN"
     try:
-        r = requests.post(
+        r = _tg_session().post(
             _tg_api("sendMessage"),
             json={"chat_id": int(chat_id), "text": text},
             timeout=10,
@@ -583,16 +873,22 @@ def check_login_two_factor_telegram():
             if not tg_user:
                 st.sidebar.error("Please enter your Telegram username.")
                 st.stop()
-            if pwd != expected:
+            if not hmac.compare_digest(pwd.encode(), str(expected).encode()):
                 st.sidebar.error("Wrong password")
                 st.stop()
+            # each send is a getUpdates + sendMessage round trip; "Start over" doesn't reset this
+            last_send = ss.get("otp_last_send")
+            if last_send is not None and time.monotonic() - last_send < OTP_RESEND_MIN_INTERVAL:
+                st.sidebar.warning("Please wait a few seconds before requesting another code.")
+                st.stop()
+            ss["otp_last_send"] = time.monotonic()
 
             ss["auth_pw_ok"] = True
             ss["login_username"] = tg_user
 
-            code = f"{random.randint(0, 999999):06d}"
+            code = f"{secrets.randbelow(1_000_000):06d}"
             ss["otp_code"] = code
-            ss["otp_time"] = int(time.time())
+            ss["otp_time"] = time.monotonic()
             ss["otp_delivery_ok"] = False
             ss["otp_delivery_msg"] = ""
 
@@ -614,7 +910,7 @@ def check_login_two_factor_telegram():
             st.rerun()
         st.stop()
 
-    if "otp_time" in ss and int(time.time()) - ss["otp_time"] > OTP_TTL_SECONDS:
+    if "otp_time" in ss and time.monotonic() - ss["otp_time"] > OTP_TTL_SECONDS:
         for k in ("auth_pw_ok", "otp_code", "otp_time", "otp_delivery_ok", "otp_delivery_msg", "login_username"):
             ss.pop(k, None)
         st.sidebar.error("Code expired. Please start over.")
@@ -626,7 +922,8 @@ def check_login_two_factor_telegram():
     colv1, colv2 = st.sidebar.columns(2)
     with colv1:
         if st.sidebar.button("Verify"):
-            if code_in.strip() == ss.get("otp_code", ""):
+            expected_code = ss.get("otp_code", "")
+            if expected_code and hmac.compare_digest(code_in.strip().encode(), expected_code.encode()):
                 ss["authed"] = True
                 for k in ("auth_pw_ok", "otp_code", "otp_time", "otp_delivery_ok", "otp_delivery_msg", "login_username"):
                     ss.pop(k, None)
@@ -663,26 +960,80 @@ def check_login_two_factor_telegram():
 # -------------------------------------------------------------
 # BACKUP / RESTORE
 # -------------------------------------------------------------
-def backup_contacts(conn: sqlite3.Connection):
-    df = pd.read_sql_query("SELECT * FROM contacts", conn)
+def _write_backup_snapshot():
+    # own connection: WAL lets this read a committed snapshot while the app keeps writing
+    with closing(sqlite3.connect(DB_FILE)) as c:
+        df = pd.read_sql_query("SELECT * FROM contacts", c)
     if not df.empty:
+        # TEXT columns can hold stray ints from older imports; pin them to string for arrow
+        df = df.astype({c: STR_DTYPE for c in df.columns if df[c].dtype == object})
         os.makedirs(DATA_DIR, exist_ok=True)
-        df.to_csv(BACKUP_FILE, index=False)
+        tmp = BACKUP_FILE + ".tmp"
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, BACKUP_FILE)
+
+
+@st.cache_resource(show_spinner=False)
+def _backup_worker() -> threading.Event:
+    pending = threading.Event()
+    writing = threading.Lock()  # the worker and the exit flush never write the file at once
+
+    def snapshot():
+        with writing:
+            if not pending.is_set():
+                return
+            pending.clear()
+            try:
+                _write_backup_snapshot()
+            except Exception as e:
+                print(f"Backup failed: {e}")
+
+    def run():
+        while True:
+            pending.wait()
+            snapshot()
+            # writes landing in the meantime just re-set the event and share the next snapshot
+            time.sleep(BACKUP_MIN_INTERVAL)
+
+    threading.Thread(target=run, name="contacts-backup", daemon=True).start()
+    # writes from the last interval before a restart would otherwise never reach the backup,
+    # and restore_from_backup_if_empty would bring back stale contacts
+    atexit.register(snapshot)
+    return pending
+
+
+def backup_contacts():
+    # the dump runs on a background thread, at most once per BACKUP_MIN_INTERVAL (and at exit)
+    _backup_worker().set()
 
 
 def restore_from_backup_if_empty(conn: sqlite3.Connection):
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM contacts")
     n = cur.fetchone()[0]
-    if n == 0 and os.path.exists(BACKUP_FILE):
+    if n == 0 and (os.path.exists(BACKUP_FILE) or os.path.exists(LEGACY_BACKUP_CSV)):
         try:
-            df = pd.read_csv(BACKUP_FILE)
+            if os.path.exists(BACKUP_FILE):
+                df = pd.read_parquet(BACKUP_FILE)
+            else:
+                df = pd.read_csv(LEGACY_BACKUP_CSV, dtype=str, keep_default_na=False, na_values=[""])
             if not df.empty:
                 upsert_contacts(conn, df)
         except Exception as e:
             print(f"Backup restore failed: {e}")
 
 
+@st.cache_resource(show_spinner=False)
+def prepare_db(_conn: sqlite3.Connection) -> bool:
+    # schema/migrations, restore-if-empty and the dedupe index: once per process (on whichever
+    # session's connection gets here first), not on every rerun; a failure isn't cached, so the
+    # next rerun retries
+    init_db(_conn)
+    restore_from_backup_if_empty(_conn)
+    ensure_dedupe_index(_conn)
+    return True
+
+
 # -------------------------------------------------------------
 # DEDUPE
 # -------------------------------------------------------------
@@ -745,8 +1096,9 @@ def dedupe_database(conn: sqlite3.Connection) -> int:
         deleted += len(losers)
 
     conn.commit()
+    clear_data_caches()
     ensure_dedupe_index(conn)
-    backup_contacts(conn)
+    backup_contacts()
     return deleted
 
 
@@ -836,35 +1188,67 @@ EXPECTED = [
     "profile_url",
 ]
 
-STUDENT_PAT = re.compile(r"\b(phd|ph\.d|student|undergrad|graduate)\b", re.I)
-PROF_PAT = re.compile(r"\b(assistant|associate|full)?\s*professor\b|department chair", re.I)
-IND_PAT = re.compile(r"\b(director|manager|engineer|scientist|vp|founder|ceo|cto|lead|principal)\b", re.I)
+CATEGORY_BUCKETS = {
+    "student": r"\b(?:phd|ph\.d|student|undergrad|graduate)\b",
+    "prof": r"\b(?:assistant|associate|full)?\s*professor\b|department chair",
+    "industry": r"\b(?:director|manager|engineer|scientist|vp|founder|ceo|cto|lead|principal)\b",
+}
+# one pass over a single title; the named group tells which bucket matched
+CATEGORY_PAT = re.compile("|".join(f"(?P<{k}>{p})" for k, p in CATEGORY_BUCKETS.items()), re.I)
+# column-wise, one str.contains per bucket is cheaper than extractall's per-match frame
+_CATEGORY_BUCKET_PATS = {k: re.compile(p, re.I) for k, p in CATEGORY_BUCKETS.items()}
 
 
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    new_cols = {c: COLMAP.get(str(c).strip().lower(), str(c).strip().lower()) for c in df.columns}
-    df = df.rename(columns=new_cols)
-    for c in EXPECTED:
-        if c not in df.columns:
-            df[c] = None
+    cols = df.columns.astype(str).str.strip().str.lower()
+    df = df.copy(deep=False)
+    df.columns = cols.map(lambda c: COLMAP.get(c, c))
+    missing = [c for c in EXPECTED if c not in df.columns]
+    if missing:
+        # one concat instead of a column insert per missing field
+        df = pd.concat([df, pd.DataFrame(None, index=df.index, columns=missing, dtype=object)], axis=1)
     return df
 
 
+ACADEMIC_DOMAINS = (".edu", ".ac.", "ac.uk", ".edu.", ".ac.nz", ".ac.in")
+_ACADEMIC_DOMAIN_RE = "|".join(re.escape(x) for x in ACADEMIC_DOMAINS)
+
+
 def infer_category(row: pd.Series) -> str:
     title = (row.get("job_title") or "")
     email = (row.get("email") or "")
     domain = email.split("@")[-1].lower() if "@" in email else ""
-    if STUDENT_PAT.search(title):
+    # collect every bucket hit, then apply the priority order (student > prof > academic domain > industry)
+    hits = {m.lastgroup for m in CATEGORY_PAT.finditer(title)}
+    if "student" in hits:
         return "PhD/Student"
-    if PROF_PAT.search(title):
+    if "prof" in hits:
         return "Professor/Academic"
-    if any(x in domain for x in (".edu", ".ac.", "ac.uk", ".edu.", ".ac.nz", ".ac.in")):
+    if any(x in domain for x in ACADEMIC_DOMAINS):
         return "Academic"
-    if IND_PAT.search(title):
+    if "industry" in hits:
         return "Industry"
     return "Other"
 
 
+def infer_category_series(job_title: pd.Series, email: pd.Series) -> pd.Series:
+    # same priority as infer_category, one regex pass per bucket instead of a row-wise apply
+    title = job_title.astype("string")
+    hits = {k: title.str.contains(p, na=False).to_numpy(bool) for k, p in _CATEGORY_BUCKET_PATS.items()}
+    email = email.astype(STR_DTYPE)
+    domain = email.str.split("@").str[-1].str.lower().where(email.str.contains("@", regex=False))
+    academic = domain.str.contains(_ACADEMIC_DOMAIN_RE, regex=True, na=False).to_numpy(bool)
+    return pd.Series(
+        np.select(
+            [hits["student"], hits["prof"], academic, hits["industry"]],
+            ["PhD/Student", "Professor/Academic", "Academic", "Industry"],
+            default="Other",
+        ),
+        index=job_title.index,
+        dtype=object,
+    )
+
+
 def parse_dt(v) -> Optional[str]:
     if v is None or str(v).strip() == "" or pd.isna(v):
         return None
@@ -874,28 +1258,86 @@ def parse_dt(v) -> Optional[str]:
         return str(v)
 
 
+# naive ISO dates/timestamps, which pandas' vectorized parser reads exactly like dateutil
+_ISO_NAIVE_DT = r"\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?"
+
+
+def parse_dt_series(s: pd.Series) -> pd.Series:
+    # dateutil is the slow part: parse each distinct value once, and send plain ISO
+    # values (the usual scanner export) through pd.to_datetime in a single call
+    uniq = pd.Series(s.dropna().unique(), dtype=object)
+    txt = uniq.astype(str).str.strip()
+    iso = txt.str.fullmatch(_ISO_NAIVE_DT)
+    fast = pd.to_datetime(txt[iso], format="ISO8601", errors="coerce")
+    parsed = {v: t.isoformat() for v, t in zip(uniq[iso], fast) if not pd.isna(t)}
+    for v in uniq:
+        if v not in parsed:
+            parsed[v] = parse_dt(v)
+    return _na_to_none(s.map(parsed))
+
+
+_STATUS_LOOKUP = {
+    **{p.lower(): p for p in PIPELINE},
+    "new lead": "New",
+    "contact": "Contacted",
+    "meeting scheduled": "Meeting",
+    "quote": "Quoted",
+    "won deal": "Won",
+    "lost deal": "Lost",
+    "follow up": "Nurture",
+    "follow-up": "Nurture",
+}
+
+
 def normalize_status(val: Any) -> Optional[str]:
     if val is None or (isinstance(val, float) and pd.isna(val)):
         return None
-    s = str(val).strip().lower()
-    if not s:
-        return None
-    for p in PIPELINE:
-        if s == p.lower():
-            return p
-    synonyms = {
-        "new lead": "New",
-        "contact": "Contacted",
-        "meeting scheduled": "Meeting",
-        "quote": "Quoted",
-        "won deal": "Won",
-        "lost deal": "Lost",
-        "follow up": "Nurture",
-        "follow-up": "Nurture",
-    }
-    if s in synonyms:
-        return synonyms[s]
-    return None
+    return _STATUS_LOOKUP.get(str(val).strip().lower())
+
+
+def normalize_status_series(s: pd.Series) -> pd.Series:
+    return _na_to_none(s.astype(STR_DTYPE).str.strip().str.lower().map(_STATUS_LOOKUP))
+
+
+# keyword buckets in priority order; the lookahead makes finditer report a hit at every
+# position, so an earlier low-priority keyword can't swallow a later high-priority one
+APPLICATION_GROUPS = {
+    "pfas": "PFAS destruction",
+    "co2": "CO2 conversion",
+    "w2e": "Waste-to-Energy",
+    "nox": "NOx production",
+    "nitrification": "Nitrification",
+    "hydrogen": "Hydrogen production",
+    "carbon_black": "Carbon black production",
+    "mining": "Mining waste",
+    "reentry": "Reentry",
+    "propulsion": "Propulsion",
+    "methane": "Methane reforming",
+    "communication": "Communication",
+    "ultrasonic": "Ultrasonic",
+    "surface": "Surface treatment",
+}
+APPLICATION_PAT = re.compile(
+    r"(?="
+    r"(?P<pfas>pfas)"
+    r"|(?P<co2>co2|carbon dioxide)"
+    r"|(?P<w2e>waste|gasification|rdf)"
+    r"|(?P<nox>nox|nitric|nitrate)"
+    r"|(?P<nitrification>nitrification)"
+    r"|(?P<hydrogen>hydrogen|h2)"
+    r"|(?P<carbon_black>carbon black|soot)"
+    r"|(?P<mining>mining|tailings)"
+    r"|(?P<reentry>reentry|re-entry)"
+    r"|(?P<propulsion>propulsion|rocket|thruster)"
+    r"|(?P<methane>methane|reforming)"
+    r"|(?P<communication>communication)"
+    r"|(?P<ultrasonic>ultrasonic|ultrasound)"
+    r"|(?P<surface>surface)"
+    r")"
+)
+# "surface" only counts together with one of these
+SURFACE_TREAT_PAT = re.compile(r"treat|coating|modify")
+_APPLICATION_LOOKUP = {a.lower(): a for a in APPLICATIONS}
 
 
 def normalize_application(val: Any) -> Optional[str]:
@@ -904,95 +1346,99 @@ def normalize_application(val: Any) -> Optional[str]:
     s = str(val).strip().lower()
     if not s:
         return None
-    for app in APPLICATIONS:
-        if s == app.lower():
-            return app
-    if "pfas" in s:
-        return "PFAS destruction"
-    if "co2" in s or "carbon dioxide" in s:
-        return "CO2 conversion"
-    if "waste" in s or "gasification" in s or "rdf" in s:
-        return "Waste-to-Energy"
-    if "nox" in s or "nitric" in s or "nitrate" in s:
-        return "NOx production"
-    if "nitrification" in s:
-        return "Nitrification"
-    if "hydrogen" in s or "h2" in s:
-        return "Hydrogen production"
-    if "carbon black" in s or "soot" in s:
-        return "Carbon black production"
-    if "mining" in s or "tailings" in s:
-        return "Mining waste"
-    if "reentry" in s or "re-entry" in s:
-        return "Reentry"
-    if "propulsion" in s or "rocket" in s or "thruster" in s:
-        return "Propulsion"
-    if "methane" in s or "reforming" in s or "steam reforming" in s:
-        return "Methane reforming"
-    if "communication" in s:
-        return "Communication"
-    if "ultrasonic" in s or "ultrasound" in s:
-        return "Ultrasonic"
-    if "surface" in s and ("treat" in s or "coating" in s or "modify" in s):
-        return "Surface treatment"
+    if s in _APPLICATION_LOOKUP:
+        return _APPLICATION_LOOKUP[s]
+    hits = {m.lastgroup for m in APPLICATION_PAT.finditer(s)}
+    if "surface" in hits and not SURFACE_TREAT_PAT.search(s):
+        hits.discard("surface")
+    for group, canon in APPLICATION_GROUPS.items():
+        if group in hits:
+            return canon
     return None
 
 
-def _fix_header_row_if_needed(df: pd.DataFrame) -> pd.DataFrame:
+def normalize_application_series(s: pd.Series) -> pd.Series:
+    s = s.astype("string").str.strip().str.lower()
+    # application is a short free-text column with few distinct values; scan each one once
+    uniq = pd.Series(s.dropna().unique(), dtype="string")
+    hits = uniq.str.extractall(APPLICATION_PAT).notna().groupby(level=0).any()
+    hits = hits.reindex(uniq.index, fill_value=False)
+    hits["surface"] &= uniq.str.contains(SURFACE_TREAT_PAT, na=False)
+    by_group = np.select(
+        [hits[g].to_numpy(bool) for g in APPLICATION_GROUPS],
+        list(APPLICATION_GROUPS.values()),
+        default=None,
+    )
+    canon = uniq.map(_APPLICATION_LOOKUP).fillna(pd.Series(by_group, index=uniq.index))
+    return _na_to_none(s.map(dict(zip(uniq, canon))))
+
+
+_KNOWN_HEADER_NAMES = frozenset(COLMAP) | frozenset(EXPECTED)
+
+
+def _header_from_first_row(df: pd.DataFrame) -> Optional[List[str]]:
+    # some exports carry a title line above the real header; promote row 0 if it looks like one
     cols_lower = [str(c).strip().lower() for c in df.columns]
     if "first_name" in cols_lower or "first name" in cols_lower:
-        return df
+        return None
     if df.empty:
-        return df
+        return None
     first_row = df.iloc[0]
     first_vals = ["" if (isinstance(v, float) and pd.isna(v)) else str(v).strip() for v in first_row]
     first_vals_lower = [v.lower() for v in first_vals]
-    known = set(COLMAP.keys()) | set(EXPECTED)
-    score = sum(1 for v in first_vals_lower if v in known)
-    if score >= 3:
-        new_cols = []
-        for i, val in enumerate(first_vals_lower):
-            new_cols.append(val if val else f"extra_{i}")
-        df = df.iloc[1:].reset_index(drop=True)
-        df.columns = new_cols
-        for c in list(df.columns):
-            if c.startswith("extra_") and df[c].isna().all():
-                df = df.drop(columns=[c])
-    return df
+    score = sum(map(_KNOWN_HEADER_NAMES.__contains__, first_vals_lower))
+    if score < 3:
+        return None
+    return [val if val else f"extra_{i}" for i, val in enumerate(first_vals_lower)]
 
 
-def load_contacts_file(uploaded_file) -> pd.DataFrame:
-    if uploaded_file.name.lower().endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
-    else:
-        df = pd.read_excel(uploaded_file)
-    return _fix_header_row_if_needed(df)
+def _apply_header(df: pd.DataFrame, header: List[str]) -> pd.DataFrame:
+    df = df.copy(deep=False)
+    df.columns = header
+    empty = [c for c in header if c.startswith("extra_") and df[c].isna().all()]
+    return df.drop(columns=empty) if empty else df
+
+
+def _fix_header_row_if_needed(df: pd.DataFrame) -> pd.DataFrame:
+    header = _header_from_first_row(df)
+    if header is None:
+        return df
+    return _apply_header(df.iloc[1:].reset_index(drop=True), header)
+
+
+def load_contacts_file(uploaded_file) -> Iterator[pd.DataFrame]:
+    # every destination column is TEXT, so skip dtype inference and keep zips/phones as typed;
+    # CSVs are read IMPORT_CHUNK_ROWS at a time so memory stays flat on big files
+    if not uploaded_file.name.lower().endswith(".csv"):
+        yield _fix_header_row_if_needed(pd.read_excel(uploaded_file, dtype=str, engine="calamine"))
+        return
+
+    reader = pd.read_csv(
+        uploaded_file,
+        dtype=str,
+        engine="c",
+        keep_default_na=False,
+        na_values=[""],
+        chunksize=IMPORT_CHUNK_ROWS,
+    )
+    header: Optional[List[str]] = None
+    start = 0
+    for i, chunk in enumerate(reader):
+        if i == 0:
+            header = _header_from_first_row(chunk)
+            if header is not None:
+                chunk = chunk.iloc[1:]
+        if header is not None:
+            chunk = _apply_header(chunk, header)
+        # file-wide row numbers, so import messages point at the row in the file, not in the chunk
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
 
 
 # -------------------------------------------------------------
 # UPSERT (NO DUPLICATES)
 # -------------------------------------------------------------
-def _find_existing_contact_id(
-    cur: sqlite3.Cursor,
-    dedupe_key: str,
-    email: Optional[str],
-    profile_url: Optional[str],
-) -> Optional[int]:
-    if email:
-        row = cur.execute("SELECT id FROM contacts WHERE email=?", (email,)).fetchone()
-        if row:
-            return int(row[0])
-    if profile_url:
-        row = cur.execute("SELECT id FROM contacts WHERE lower(profile_url)=?", (profile_url.lower(),)).fetchone()
-        if row:
-            return int(row[0])
-    if dedupe_key:
-        row = cur.execute("SELECT id FROM contacts WHERE dedupe_key=?", (dedupe_key,)).fetchone()
-        if row:
-            return int(row[0])
-    return None
-
-
 def _usd_to_cents(x: Any) -> Optional[int]:
     if x is None:
         return None
@@ -1024,7 +1470,7 @@ _SALES_LINE_RE = re.compile(
 )
 
 
-def _extract_sales_rows_from_import(r: pd.Series) -> List[Dict[str, Any]]:
+def _extract_sales_rows_from_import(r: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Supports import from your exported CSV where 'sales_lines' looks like:
       2025-12-31: 1 kW x1 @ $35,000 | 2026-01-02: 10 kW x2 @ $40,000
@@ -1093,309 +1539,585 @@ def _extract_sales_rows_from_import(r: pd.Series) -> List[Dict[str, Any]]:
     return rows
 
 
-def _upsert_sales_rows(conn: sqlite3.Connection, contact_id: int, sales_rows: List[Dict[str, Any]]):
-    if not sales_rows:
-        return
-    cur = conn.cursor()
-    for sr in sales_rows:
-        sold_at = str(sr["sold_at"])[:10]
-        product = (sr["product"] or "").strip() or "1 kW"
-        qty = int(sr.get("qty") or 1)
-        unit_price_cents = int(sr.get("unit_price_cents") or 0)
-        note = (sr.get("note") or "").strip() or None
-
-        # Avoid duplicates
-        exists = cur.execute(
-            """
-            SELECT 1 FROM sales
-            WHERE contact_id=? AND sold_at=? AND product=? AND qty=? AND unit_price_cents=?
-            """,
-            (int(contact_id), sold_at, product, int(qty), int(unit_price_cents)),
-        ).fetchone()
-        if exists:
-            continue
+def _na_to_none(s: pd.Series) -> pd.Series:
+    return s.astype(object).where(s.notna(), None)
 
-        cur.execute(
-            """
-            INSERT INTO sales(contact_id, sold_at, product, qty, unit_price_cents, currency, note)
-            VALUES (?,?,?,?,?,?,?)
-            """,
-            (int(contact_id), sold_at, product, int(qty), int(unit_price_cents), "USD", note),
-        )
-    conn.commit()
 
+def _clean_text_series(s: pd.Series) -> pd.Series:
+    # nullable-string pass: strip once, blank -> None (no whole-frame fillna copy)
+    return _na_to_none(s.astype(STR_DTYPE).str.strip().replace("", pd.NA))
 
-def upsert_contacts(conn: sqlite3.Connection, df: pd.DataFrame) -> int:
-    df = normalize_columns(df).fillna("")
-    df["category"] = df.apply(infer_category, axis=1)
-    df["scan_datetime"] = df["scan_datetime"].apply(parse_dt)
-    df["status_norm"] = df.get("status", "").apply(normalize_status)
 
-    n = 0
-    cur = conn.cursor()
+def _norm_email_series(s: pd.Series) -> pd.Series:
+    # vectorized _norm_email over already-stripped values
+    s = s.astype(STR_DTYPE).str.lower().str.replace(r"\s+", " ", regex=True)
+    return _na_to_none(s.where(s.str.contains("@", regex=False).fillna(False)))
 
-    for idx, r in df.iterrows():
-        email = (_norm_email(r.get("email")) or None)
-        raw_note = r.get("notes")
-        note_text = sanitize_note_text(raw_note, trim_email_threads=True)
-
-        scan_dt = r.get("scan_datetime") or None
-        first = (r.get("first_name") or "").strip() or None
-        last = (r.get("last_name") or "").strip() or None
-        job = (r.get("job_title") or "").strip() or None
-        company = (r.get("company") or "").strip() or None
-        street = (r.get("street") or "").strip() or None
-        street2 = (r.get("street2") or "").strip() or None
-        zipc = (r.get("zip_code") or "").strip() or None
-        city = (r.get("city") or "").strip() or None
-        state = (r.get("state") or "").strip() or None
-        country = (r.get("country") or "").strip() or None
-        phone = str(r.get("phone") or "").strip() or None
-        website = _clean_url(r.get("website") or "") or None
-        gender = (r.get("gender") or "").strip() or None
-        application = normalize_application(r.get("application"))
-        product_interest = (r.get("product_interest") or "").strip() or None
-        owner = (r.get("owner") or "").strip() or None
-        last_touch = (r.get("last_touch") or "").strip() or None
-        photo = (r.get("photo") or "").strip() or None
-        profile_url = _clean_url(r.get("profile_url") or "") or None
-
-        status_from_file = r.get("status_norm") or None
-        dedupe_key = compute_dedupe_key(first, last, company, email, profile_url) or None
 
-        try:
-            existing_id = _find_existing_contact_id(cur, dedupe_key or "", email, profile_url)
-            existing_status = None
-            if existing_id:
-                row2 = cur.execute("SELECT status FROM contacts WHERE id=?", (existing_id,)).fetchone()
-                existing_status = (row2[0] if row2 else "New") or "New"
-
-            final_status = status_from_file or existing_status or "New"
-
-            if existing_id:
-                if (existing_status or "New").strip() != (final_status or "New").strip():
-                    cur.execute(
-                        "INSERT INTO status_history(contact_id, ts, old_status, new_status) VALUES (?,?,?,?)",
-                        (
-                            existing_id,
-                            datetime.utcnow().isoformat(),
-                            (existing_status or "New").strip(),
-                            (final_status or "New").strip(),
-                        ),
-                    )
+def _clean_url_series(s: pd.Series) -> pd.Series:
+    # vectorized _clean_url over already-stripped values
+    s = s.astype(STR_DTYPE)
+    has_scheme = (s.str.startswith("http://") | s.str.startswith("https://")).fillna(False)
+    return _na_to_none(s.where(has_scheme, "https://" + s.str.lstrip("/")))
 
-                cur.execute(
-                    """
-                    UPDATE contacts SET
-                      scan_datetime=?,
-                      first_name=?,
-                      last_name=?,
-                      job_title=?,
-                      company=?,
-                      street=?,
-                      street2=?,
-                      zip_code=?,
-                      city=?,
-                      state=?,
-                      country=?,
-                      phone=?,
-                      email=?,
-                      website=?,
-                      category=?,
-                      status=?,
-                      owner=?,
-                      last_touch=?,
-                      gender=?,
-                      application=?,
-                      product_interest=?,
-                      photo=?,
-                      profile_url=?,
-                      dedupe_key=?
-                    WHERE id=?
-                    """,
-                    (
-                        scan_dt,
-                        first,
-                        last,
-                        job,
-                        company,
-                        street,
-                        street2,
-                        zipc,
-                        city,
-                        state,
-                        country,
-                        phone,
-                        email,
-                        website,
-                        r.get("category") or "Other",
-                        final_status,
-                        owner,
-                        last_touch,
-                        gender,
-                        application,
-                        product_interest,
-                        photo,
-                        profile_url,
-                        dedupe_key,
-                        existing_id,
-                    ),
-                )
-                contact_id = existing_id
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO contacts (
-                      scan_datetime, first_name, last_name, job_title, company, street, street2, zip_code,
-                      city, state, country, phone, email, website, category, status, owner, last_touch,
-                      gender, application, product_interest, photo, profile_url, dedupe_key
-                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                    """,
-                    (
-                        scan_dt,
-                        first,
-                        last,
-                        job,
-                        company,
-                        street,
-                        street2,
-                        zipc,
-                        city,
-                        state,
-                        country,
-                        phone,
-                        email,
-                        website,
-                        r.get("category") or "Other",
-                        final_status,
-                        owner,
-                        last_touch,
-                        gender,
-                        application,
-                        product_interest,
-                        photo,
-                        profile_url,
-                        dedupe_key,
-                    ),
-                )
-                contact_id = cur.lastrowid
-
-            if note_text:
-                ts_iso = scan_dt or datetime.utcnow().isoformat()
-                cur.execute("SELECT 1 FROM notes WHERE contact_id=? AND body=?", (contact_id, note_text))
-                if not cur.fetchone():
-                    cur.execute(
-                        "INSERT INTO notes(contact_id, ts, body, next_followup) VALUES (?,?,?,?)",
-                        (contact_id, ts_iso, note_text, None),
-                    )
 
-            # ✅ IMPORTANT: import sales (if present in the uploaded CSV/export)
-            sales_rows = _extract_sales_rows_from_import(r)
-            if sales_rows:
-                _upsert_sales_rows(conn, int(contact_id), sales_rows)
+_SALES_IMPORT_COLS = (
+    "sales_lines",
+    "sold_qty",
+    "sold_revenue_cents",
+    "sold_revenue_usd",
+    "first_sold_at",
+    "last_sold_at",
+)
 
-            n += 1
+# contact columns written by the import, in staging-table order
+_UPSERT_COLS = [
+    "scan_datetime",
+    "first_name",
+    "last_name",
+    "job_title",
+    "company",
+    "street",
+    "street2",
+    "zip_code",
+    "city",
+    "state",
+    "country",
+    "phone",
+    "email",
+    "website",
+    "category",
+    "status",
+    "owner",
+    "last_touch",
+    "gender",
+    "application",
+    "product_interest",
+    "photo",
+    "profile_url",
+    "dedupe_key",
+]
 
-        except sqlite3.Error as e:
-            st.error(
-                f"Database error on row {idx + 1} "
-                f"(email='{email}', name='{(first or '')} {(last or '')}'): {e}"
-            )
-            continue
+# last staged row per matched contact (several file rows can resolve to the same contact)
+_STG_MATCHED_LAST = """
+    SELECT MAX(grp) FROM stg_contacts WHERE contact_id IS NOT NULL AND NOT is_new GROUP BY contact_id
+"""
 
-    conn.commit()
-    backup_contacts(conn)
-    ensure_dedupe_index(conn)
-    return n
 
+def _stage_import_rows(cur: sqlite3.Cursor, contacts: pd.DataFrame, notes: List[Tuple], sales: List[Tuple]):
+    cols = ", ".join(_UPSERT_COLS)
+    cur.execute("DROP TABLE IF EXISTS temp.stg_contacts")
+    cur.execute("DROP TABLE IF EXISTS temp.stg_notes")
+    cur.execute("DROP TABLE IF EXISTS temp.stg_sales")
+    cur.execute(
+        "CREATE TEMP TABLE stg_contacts ("
+        f"grp INTEGER PRIMARY KEY, contact_id INTEGER, alias_of INTEGER, is_new INTEGER DEFAULT 0, {cols})"
+    )
+    cur.execute("CREATE TEMP TABLE stg_notes (seq INTEGER PRIMARY KEY, grp INTEGER, ts INTEGER, body TEXT)")
+    cur.execute(
+        "CREATE TEMP TABLE stg_sales ("
+        "seq INTEGER PRIMARY KEY, grp INTEGER, sold_at TEXT, product TEXT, qty INTEGER, unit_price_cents INTEGER, note TEXT)"
+    )
+    cur.executemany(
+        f"INSERT INTO stg_contacts (grp, {cols}) VALUES ({', '.join('?' * (len(_UPSERT_COLS) + 1))})",
+        zip(contacts["grp"].tolist(), *(contacts[c].tolist() for c in _UPSERT_COLS)),
+    )
+    cur.executemany("INSERT INTO stg_notes (grp, ts, body) VALUES (?,?,?)", notes)
+    cur.executemany(
+        "INSERT INTO stg_sales (grp, sold_at, product, qty, unit_price_cents, note) VALUES (?,?,?,?,?,?)",
+        sales,
+    )
 
-# -------------------------------------------------------------
-# QUERIES & NOTES
-# -------------------------------------------------------------
-def query_contacts(
-    conn: sqlite3.Connection,
-    q: str,
-    cats: List[str],
-    stats: List[str],
-    state_like: str,
-    app_filter: List[str],
-    prod_filter: List[str],
-) -> pd.DataFrame:
-    sql = """
-        SELECT *,
-               (SELECT MAX(ts) FROM notes n WHERE n.contact_id = c.id) AS last_note_ts
-        FROM contacts c
-        WHERE 1=1
-    """
+
+def _merge_staged_rows(cur: sqlite3.Cursor) -> List[Tuple]:
+    # resolve staged rows to existing contacts: email, then profile url, then dedupe key;
+    # each lookup only probes the keys present in the file (indexed), not the whole table.
+    # Returns (grp, first_name, last_name, email) for rows skipped over a dedupe key clash.
+    cur.execute(
+        """
+        UPDATE stg_contacts SET contact_id = m.id
+        FROM (
+          SELECT email, MIN(id) AS id FROM contacts
+          WHERE email IN (SELECT email FROM stg_contacts)
+          GROUP BY email
+        ) AS m
+        WHERE stg_contacts.contact_id IS NULL AND stg_contacts.email = m.email
+        """
+    )
+    cur.execute(
+        """
+        UPDATE stg_contacts SET contact_id = m.id
+        FROM (
+          SELECT lower(profile_url) AS profile, MIN(id) AS id FROM contacts
+          WHERE lower(profile_url) IN (SELECT lower(profile_url) FROM stg_contacts WHERE profile_url IS NOT NULL)
+          GROUP BY lower(profile_url)
+        ) AS m
+        WHERE stg_contacts.contact_id IS NULL AND lower(stg_contacts.profile_url) = m.profile
+        """
+    )
+    cur.execute(
+        """
+        UPDATE stg_contacts SET contact_id = m.id
+        FROM (
+          SELECT dedupe_key, MIN(id) AS id FROM contacts
+          WHERE dedupe_key IN (SELECT dedupe_key FROM stg_contacts)
+            AND dedupe_key IS NOT NULL AND TRIM(dedupe_key) <> ''
+          GROUP BY dedupe_key
+        ) AS m
+        WHERE stg_contacts.contact_id IS NULL AND stg_contacts.dedupe_key = m.dedupe_key
+        """
+    )
+
+    # an unmatched row that shares an email (else a profile url) with an earlier row of the file
+    # lands on that row's contact, as if the earlier row had already been saved
+    cur.execute(
+        """
+        UPDATE stg_contacts SET alias_of = r.root
+        FROM (
+          SELECT grp, COALESCE(NULLIF(by_email, grp), NULLIF(by_profile, grp)) AS root FROM (
+            SELECT grp,
+                   CASE WHEN email IS NOT NULL THEN MIN(grp) OVER (PARTITION BY email) END AS by_email,
+                   CASE WHEN profile_url IS NOT NULL THEN MIN(grp) OVER (PARTITION BY lower(profile_url)) END
+                     AS by_profile
+            FROM stg_contacts
+          )
+        ) AS r
+        WHERE stg_contacts.contact_id IS NULL AND stg_contacts.grp = r.grp AND r.root IS NOT NULL
+        """
+    )
+
+    # remaining unmatched rows get fresh ids up front so notes/sales can be attached by grp
+    base_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM contacts").fetchone()[0]
+    cur.execute(
+        """
+        UPDATE stg_contacts SET contact_id = ? + r.rn, is_new = 1
+        FROM (
+          SELECT grp, ROW_NUMBER() OVER (ORDER BY grp) AS rn FROM stg_contacts
+          WHERE contact_id IS NULL AND alias_of IS NULL
+        ) AS r
+        WHERE stg_contacts.grp = r.grp
+        """,
+        (base_id,),
+    )
+    # aliases point at lower grps, so each pass settles at least one more link of a chain
+    while cur.execute(
+        """
+        UPDATE stg_contacts SET contact_id = t.contact_id
+        FROM stg_contacts AS t
+        WHERE stg_contacts.contact_id IS NULL AND t.grp = stg_contacts.alias_of AND t.contact_id IS NOT NULL
+        """
+    ).rowcount:
+        pass
+
+    # a row matched by email/profile can carry a dedupe key another contact already owns; the
+    # unique index would fail the whole chunk, so skip just those rows (with their notes/sales)
+    skipped = cur.execute(
+        """
+        SELECT grp, first_name, last_name, email FROM stg_contacts s
+        WHERE NOT is_new AND dedupe_key IS NOT NULL AND TRIM(dedupe_key) <> ''
+          AND EXISTS (
+            SELECT 1 FROM contacts c
+            WHERE c.dedupe_key = s.dedupe_key AND c.dedupe_key IS NOT NULL AND TRIM(c.dedupe_key) <> ''
+              AND c.id <> s.contact_id
+          )
+        ORDER BY grp
+        """
+    ).fetchall()
+    if skipped:
+        grps = json.dumps([r[0] for r in skipped])
+        for table in ("stg_contacts", "stg_notes", "stg_sales"):
+            cur.execute(f"DELETE FROM {table} WHERE grp IN (SELECT value FROM json_each(?))", (grps,))
+
+    # new contacts go in first: later rows of the file that landed on them update them below
+    cols = ", ".join(_UPSERT_COLS)
+    values = ", ".join("COALESCE(status, 'New')" if c == "status" else c for c in _UPSERT_COLS)
+    cur.execute(
+        f"""
+        INSERT INTO contacts (id, {cols})
+        SELECT contact_id, {values} FROM stg_contacts WHERE is_new ORDER BY grp
+        """
+    )
+
+    cur.execute(
+        f"""
+        INSERT INTO status_history(contact_id, ts, old_status, new_status)
+        SELECT c.id, ?, TRIM(COALESCE(NULLIF(c.status, ''), 'New')), TRIM(s.status)
+        FROM stg_contacts s JOIN contacts c ON c.id = s.contact_id
+        WHERE s.grp IN ({_STG_MATCHED_LAST})
+          AND s.status IS NOT NULL
+          AND TRIM(COALESCE(NULLIF(c.status, ''), 'New')) <> TRIM(s.status)
+        ORDER BY s.grp
+        """,
+        (_now_ms(),),
+    )
+
+    assignments = ",\n          ".join(
+        "status = COALESCE(s.status, NULLIF(contacts.status, ''), 'New')" if c == "status" else f"{c} = s.{c}"
+        for c in _UPSERT_COLS
+    )
+    cur.execute(
+        f"""
+        UPDATE contacts SET
+          {assignments}
+        FROM stg_contacts AS s
+        WHERE contacts.id = s.contact_id AND s.grp IN ({_STG_MATCHED_LAST})
+        """
+    )
+
+    # first occurrence wins for notes/sales repeated in the file or already stored
+    cur.execute(
+        """
+        INSERT INTO notes(contact_id, ts, body, next_followup)
+        SELECT contact_id, ts, body, NULL FROM (
+          SELECT s.contact_id AS contact_id, n.ts AS ts, n.body AS body, MIN(n.seq) AS seq
+          FROM stg_notes n JOIN stg_contacts s ON s.grp = n.grp
+          GROUP BY s.contact_id, n.body
+        ) AS d
+        WHERE NOT EXISTS (SELECT 1 FROM notes x WHERE x.contact_id = d.contact_id AND x.body = d.body)
+        ORDER BY seq
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO sales(contact_id, sold_at, product, qty, unit_price_cents, currency, note)
+        SELECT contact_id, sold_at, product, qty, unit_price_cents, 'USD', note FROM (
+          SELECT s.contact_id AS contact_id, x.sold_at AS sold_at, x.product AS product, x.qty AS qty,
+                 x.unit_price_cents AS unit_price_cents, x.note AS note, MIN(x.seq) AS seq
+          FROM stg_sales x JOIN stg_contacts s ON s.grp = x.grp
+          GROUP BY s.contact_id, x.sold_at, x.product, x.qty, x.unit_price_cents
+        ) AS d
+        WHERE NOT EXISTS (
+          SELECT 1 FROM sales y
+          WHERE y.contact_id = d.contact_id AND y.sold_at = d.sold_at AND y.product = d.product
+            AND y.qty = d.qty AND y.unit_price_cents = d.unit_price_cents
+        )
+        ORDER BY seq
+        """
+    )
+
+    cur.execute("DROP TABLE temp.stg_contacts")
+    cur.execute("DROP TABLE temp.stg_notes")
+    cur.execute("DROP TABLE temp.stg_sales")
+    return skipped
+
+
+def upsert_contacts(conn: sqlite3.Connection, df: pd.DataFrame) -> Optional[int]:
+    # rows saved, or None when the chunk's transaction was rolled back
+    df = normalize_columns(df)
+    # first header wins if two source columns map to the same field
+    first_seen = ~df.columns.duplicated()
+    df = pd.DataFrame(
+        {c: _clean_text_series(df.iloc[:, i]) for i, c in enumerate(df.columns) if first_seen[i]},
+        index=df.index,
+    )
+    df["email"] = _norm_email_series(df["email"])
+    df["website"] = _clean_url_series(df["website"])
+    df["profile_url"] = _clean_url_series(df["profile_url"])
+    df["application"] = normalize_application_series(df["application"])
+    df["category"] = infer_category_series(df["job_title"], df["email"])
+    df["scan_datetime"] = parse_dt_series(df["scan_datetime"])
+    df["status"] = normalize_status_series(df["status"])
+    df["dedupe_key"] = [
+        compute_dedupe_key(*r) or None
+        for r in zip(df["first_name"], df["last_name"], df["company"], df["email"], df["profile_url"])
+    ]
+
+    # rows sharing a dedupe key collapse onto one contact (blank keys stay separate): the group is
+    # numbered by its first row so new ids follow file order, the last row's values win, and status
+    # keeps the last non-blank value so a later row without one doesn't reset it
+    pos = pd.Series(range(len(df)), index=df.index)
+    by_key = pos.groupby(df["dedupe_key"].where(df["dedupe_key"].notna(), "row:" + pos.astype(str)).values)
+    df["grp"] = by_key.transform("min")
+    is_last = (pos == by_key.transform("max")).values
+    df["status"] = _na_to_none(df.groupby("grp")["status"].transform("last"))
+
+    grps = df["grp"].tolist()
+    now_ms = _now_ms()
+    note_rows = [
+        (g, _to_epoch_ms(scan_dt) or now_ms, body)
+        for g, scan_dt, body in zip(
+            grps,
+            df["scan_datetime"],
+            df["notes"].map(lambda v: sanitize_note_text(v, trim_email_threads=True)),
+        )
+        if body
+    ]
+
+    sales_rows = []
+    sales_cols = [c for c in _SALES_IMPORT_COLS if c in df.columns]
+    if sales_cols:
+        for g, rec in zip(grps, df[sales_cols + ["product_interest"]].to_dict("records")):
+            for sr in _extract_sales_rows_from_import(rec):
+                sales_rows.append(
+                    (
+                        g,
+                        str(sr["sold_at"])[:10],
+                        (sr["product"] or "").strip() or "1 kW",
+                        int(sr.get("qty") or 1),
+                        int(sr.get("unit_price_cents") or 0),
+                        (sr.get("note") or "").strip() or None,
+                    )
+                )
+
+    try:
+        with write_txn(conn):
+            cur = conn.cursor()
+            _stage_import_rows(cur, df[is_last], note_rows, sales_rows)
+            skipped = _merge_staged_rows(cur)
+    except sqlite3.Error as e:
+        # df.index is the file-wide row number; rows before this chunk are already committed
+        start = int(df.index[0]) if len(df) else 0
+        if start == 0:
+            st.error(f"Database error during import ({len(df)} rows, nothing saved): {e}")
+        else:
+            st.error(
+                f"Database error during import: rows {start + 1}–{start + len(df)} not saved; "
+                f"rows 1–{start} were committed: {e}"
+            )
+        return None
+
+    for g, first, last, email in skipped:
+        st.error(
+            f"Skipped row {df.index[g] + 1} (email='{email}', name='{(first or '')} {(last or '')}'): "
+            "its dedupe key already belongs to another contact"
+        )
+
+    clear_data_caches()
+    backup_contacts()
+    ensure_dedupe_index(conn)
+    return len(df) - int(df["grp"].isin([r[0] for r in skipped]).sum())
+
+
+# -------------------------------------------------------------
+# QUERIES & NOTES
+# -------------------------------------------------------------
+CONTACT_COLS = [
+    "id",
+    "scan_datetime",
+    "first_name",
+    "last_name",
+    "job_title",
+    "company",
+    "street",
+    "street2",
+    "zip_code",
+    "city",
+    "state",
+    "country",
+    "phone",
+    "email",
+    "website",
+    "category",
+    "status",
+    "owner",
+    "last_touch",
+    "gender",
+    "application",
+    "product_interest",
+    "photo",
+    "profile_url",
+]
+
+# thin projection for the contacts table + picker (the editor loads the full row via get_contact)
+CONTACT_LIST_COLS = [
+    "id",
+    "first_name",
+    "last_name",
+    "company",
+    "email",
+    "status",
+    "owner",
+    "application",
+    "product_interest",
+]
+
+
+def _contact_filters_sql(
+    q: str,
+    cats: List[str],
+    stats: List[str],
+    state_like: str,
+    app_filter: List[str],
+    prod_filter: List[str],
+) -> Tuple[str, List[Any]]:
+    # multi-selects bind as one JSON array, so the SQL text (and its cached plan) doesn't
+    # change with the number of options picked
+    sql = ""
     params: List[Any] = []
 
-    if q:
+    if q and len(q) >= 3:
+        # quoted phrase = substring match with the trigram tokenizer
+        sql += " AND c.id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?)"
+        params.append('"' + q.replace('"', '""') + '"')
+    elif q:
         like = f"%{q}%"
         sql += " AND (first_name LIKE ? OR last_name LIKE ? OR email LIKE ? OR company LIKE ?)"
         params += [like, like, like, like]
 
     if cats:
-        sql += " AND category IN (" + ",".join("?" for _ in cats) + ")"
-        params += cats
+        sql += " AND category IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(cats))
 
     if stats:
-        sql += " AND status IN (" + ",".join("?" for _ in stats) + ")"
-        params += stats
+        sql += " AND status IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(stats))
 
     if state_like:
         sql += " AND state LIKE ?"
         params.append(f"%{state_like}%")
 
     if app_filter:
-        sql += " AND application IN (" + ",".join("?" for _ in app_filter) + ")"
-        params += app_filter
+        sql += " AND application IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(app_filter))
 
     if prod_filter:
-        sql += " AND product_interest IN (" + ",".join("?" for _ in prod_filter) + ")"
-        params += prod_filter
+        sql += " AND product_interest IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(prod_filter))
+
+    return sql, params
 
-    return pd.read_sql_query(sql, conn, params=params)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def query_contacts(
+    _conn: sqlite3.Connection,
+    q: str,
+    cats: List[str],
+    stats: List[str],
+    state_like: str,
+    app_filter: List[str],
+    prod_filter: List[str],
+) -> pd.DataFrame:
+    where_sql, params = _contact_filters_sql(q, cats, stats, state_like, app_filter, prod_filter)
+    # notes are concatenated per selected contact through idx_notes_contact (already in ts order),
+    # so a filtered export only touches the notes it actually ships
+    sql = f"""
+        SELECT {", ".join("c." + c for c in CONTACT_COLS)},
+          (SELECT GROUP_CONCAT(body, ' || ') FROM (
+             SELECT TRIM(n.body, ' ' || char(9, 10, 13)) AS body
+             FROM notes n
+             WHERE n.contact_id = c.id AND TRIM(n.body, ' ' || char(9, 10, 13)) <> ''
+             ORDER BY n.ts
+          )) AS notes
+        FROM contacts c
+        WHERE 1=1
+    """
+    return pd.read_sql_query(sql + where_sql, _conn, params=params)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def query_contacts_list(
+    _conn: sqlite3.Connection,
+    q: str,
+    cats: List[str],
+    stats: List[str],
+    state_like: str,
+    app_filter: List[str],
+    prod_filter: List[str],
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> pd.DataFrame:
+    where_sql, params = _contact_filters_sql(q, cats, stats, state_like, app_filter, prod_filter)
+    # per-row MAX(ts) is one idx_notes_contact seek, so a page only looks at its own contacts' notes
+    sql = f"""
+        SELECT {", ".join("c." + c for c in CONTACT_LIST_COLS)},
+               (SELECT MAX(n.ts) FROM notes n WHERE n.contact_id = c.id) AS last_note_ts
+        FROM contacts c
+        WHERE 1=1
+    """
+    sql += where_sql + " ORDER BY c.id"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [int(limit), int(offset)]
+    return pd.read_sql_query(sql, _conn, params=params)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def count_contacts(
+    _conn: sqlite3.Connection,
+    q: str,
+    cats: List[str],
+    stats: List[str],
+    state_like: str,
+    app_filter: List[str],
+    prod_filter: List[str],
+) -> int:
+    where_sql, params = _contact_filters_sql(q, cats, stats, state_like, app_filter, prod_filter)
+    return int(_conn.execute("SELECT COUNT(*) FROM contacts c WHERE 1=1" + where_sql, params).fetchone()[0])
+
+
+def get_contact(conn: sqlite3.Connection, contact_id: int) -> Optional[Dict[str, Any]]:
+    r = conn.execute(
+        f"SELECT {', '.join(CONTACT_COLS)} FROM contacts WHERE id=?",
+        (int(contact_id),),
+    ).fetchone()
+    if not r:
+        return None
+    return dict(zip(CONTACT_COLS, r))
 
 
 def get_notes(conn: sqlite3.Connection, contact_id: int) -> pd.DataFrame:
-    return pd.read_sql_query(
+    df = pd.read_sql_query(
         "SELECT ts, body, next_followup FROM notes WHERE contact_id=? ORDER BY ts DESC",
         conn,
         params=(contact_id,),
     )
+    df["ts"] = ms_series_to_text(df["ts"])
+    return df
 
 
-def get_notes_agg(conn: sqlite3.Connection) -> pd.DataFrame:
-    df = pd.read_sql_query("SELECT contact_id, ts, body FROM notes ORDER BY contact_id, ts", conn)
-    if df.empty:
-        return pd.DataFrame(columns=["contact_id", "notes"])
-    grouped = (
-        df.groupby("contact_id")["body"]
-        .apply(lambda s: " || ".join([str(x).strip() for x in s if str(x).strip() != ""]))
-        .reset_index(name="notes")
+def clear_data_caches():
+    # call after any write to contacts/notes/sales/status_history so cached reads don't serve stale rows
+    query_contacts.clear()
+    query_contacts_list.clear()
+    count_contacts.clear()
+    get_export_csv_bytes.clear()
+    get_sales_agg.clear()
+    get_sales_yearly_totals.clear()
+    get_conversion_stats.clear()
+    get_sold_summary.clear()
+    get_overview_contacts.clear()
+    get_overview_lead_lists.clear()
+
+
+def _apply_status_change(conn: sqlite3.Connection, contact_id: int, old_status: str, new_status: str):
+    now = datetime.now(timezone.utc)
+    conn.execute(
+        "INSERT INTO status_history(contact_id, ts, old_status, new_status) VALUES (?,?,?,?)",
+        (contact_id, int(now.timestamp() * 1000), old_status, new_status),
+    )
+    conn.execute(
+        "UPDATE contacts SET status=?, last_touch=? WHERE id=?",
+        (new_status, now.replace(tzinfo=None).isoformat(), contact_id),
     )
-    return grouped
 
 
 def update_contact_status(conn: sqlite3.Connection, contact_id: int, new_status: str):
     new_status = (new_status or "New").strip()
-    cur = conn.cursor()
-    cur.execute("SELECT status FROM contacts WHERE id=?", (contact_id,))
-    row = cur.fetchone()
-    if not row:
-        return
-    old_status = (row[0] or "New").strip()
-    if old_status == new_status:
+    now = datetime.now(timezone.utc)
+    # SQLite reads the old status inside the write lock: no separate SELECT round trip, and a
+    # concurrent change can't slip between the read and the history row
+    with write_txn(conn):
+        cur = conn.execute(
+            """
+            INSERT INTO status_history(contact_id, ts, old_status, new_status)
+            SELECT id, ?, old_status, ? FROM (
+              SELECT id, TRIM(COALESCE(NULLIF(status, ''), 'New'), ' ' || char(9, 10, 13)) AS old_status
+              FROM contacts WHERE id = ?
+            )
+            WHERE old_status <> ?
+            """,
+            (int(now.timestamp() * 1000), new_status, contact_id, new_status),
+        )
+        changed = cur.rowcount > 0
+        if changed:
+            conn.execute(
+                "UPDATE contacts SET status=?, last_touch=? WHERE id=?",
+                (new_status, now.replace(tzinfo=None).isoformat(), contact_id),
+            )
+    if not changed:
         return
-
-    ts_iso = datetime.utcnow().isoformat()
-    cur.execute(
-        "INSERT INTO status_history(contact_id, ts, old_status, new_status) VALUES (?,?,?,?)",
-        (contact_id, ts_iso, old_status, new_status),
-    )
-    cur.execute("UPDATE contacts SET status=?, last_touch=? WHERE id=?", (new_status, ts_iso, contact_id))
-    conn.commit()
-    backup_contacts(conn)
+    clear_data_caches()
+    backup_contacts()
 
 
 # -------------------------------------------------------------
@@ -1424,11 +2146,13 @@ def add_sale_line(
         (int(contact_id), sold_at_iso, (product or "").strip(), qty, int(cents), "USD", (note or "").strip() or None),
     )
     conn.commit()
+    clear_data_caches()
 
 
 def delete_sale_line(conn: sqlite3.Connection, sale_id: int):
     conn.execute("DELETE FROM sales WHERE id=?", (int(sale_id),))
     conn.commit()
+    clear_data_caches()
 
 
 def get_sales_for_contact(conn: sqlite3.Connection, contact_id: int) -> pd.DataFrame:
@@ -1457,7 +2181,8 @@ def get_sales_for_contact(conn: sqlite3.Connection, contact_id: int) -> pd.DataF
     return df[wanted]
 
 
-def get_sales_agg(conn: sqlite3.Connection) -> pd.DataFrame:
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sales_agg(_conn: sqlite3.Connection) -> pd.DataFrame:
     df = pd.read_sql_query(
         """
         SELECT
@@ -1469,7 +2194,7 @@ def get_sales_agg(conn: sqlite3.Connection) -> pd.DataFrame:
         FROM sales s
         GROUP BY s.contact_id
         """,
-        conn,
+        _conn,
     )
     if df.empty:
         return pd.DataFrame(
@@ -1490,7 +2215,7 @@ def get_sales_agg(conn: sqlite3.Connection) -> pd.DataFrame:
 
     df_lines = pd.read_sql_query(
         "SELECT contact_id, sold_at, product, qty, unit_price_cents FROM sales ORDER BY sold_at ASC, id ASC",
-        conn,
+        _conn,
     )
 
     def fmt_line(r):
@@ -1518,7 +2243,8 @@ def get_sales_agg(conn: sqlite3.Connection) -> pd.DataFrame:
     return df
 
 
-def get_sales_yearly_totals(conn: sqlite3.Connection) -> pd.DataFrame:
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sales_yearly_totals(_conn: sqlite3.Connection) -> pd.DataFrame:
     df = pd.read_sql_query(
         """
         SELECT
@@ -1529,7 +2255,7 @@ def get_sales_yearly_totals(conn: sqlite3.Connection) -> pd.DataFrame:
         GROUP BY CAST(strftime('%Y', sold_at) AS INTEGER)
         ORDER BY year ASC
         """,
-        conn,
+        _conn,
     )
     if df.empty:
         return pd.DataFrame(columns=["year", "qty", "revenue_usd"])
@@ -1554,37 +2280,35 @@ def _try_parse_iso(ts: Any) -> Optional[datetime]:
         return None
 
 
-def get_conversion_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
-    df_hist = pd.read_sql_query(
-        "SELECT contact_id, ts, new_status FROM status_history ORDER BY contact_id, ts",
-        conn,
-    )
-    df_contacts = pd.read_sql_query("SELECT id, status FROM contacts", conn)
+@st.cache_data(ttl=60, show_spinner=False)
+def get_conversion_stats(_conn: sqlite3.Connection) -> Dict[str, Any]:
+    # every read here is walked row by row in Python, so plain cursor tuples, no DataFrames
+    hist_rows = _conn.execute(
+        "SELECT contact_id, ts, new_status FROM status_history ORDER BY contact_id, ts"
+    ).fetchall()
+    contact_rows = _conn.execute("SELECT id, status FROM contacts").fetchall()
 
     first_contacted: Dict[int, datetime] = {}
     first_won_status: Dict[int, datetime] = {}
 
-    for r in df_hist.itertuples(index=False):
-        cid = int(r.contact_id)
-        ts = _try_parse_iso(r.ts)
+    for contact_id, ts_ms, new_status in hist_rows:
+        cid = int(contact_id)
+        ts = _ms_to_datetime(ts_ms)
         if not ts:
             continue
-        ns = (r.new_status or "").strip()
+        ns = (new_status or "").strip()
         if ns == "Contacted" and cid not in first_contacted:
             first_contacted[cid] = ts
         if ns == "Won" and cid not in first_won_status:
             first_won_status[cid] = ts
 
-    df_sales_min = pd.read_sql_query(
-        "SELECT contact_id, MIN(sold_at) AS first_sold_at FROM sales GROUP BY contact_id",
-        conn,
-    )
     first_sold: Dict[int, datetime] = {}
-    for r in df_sales_min.itertuples(index=False):
-        cid = int(r.contact_id)
-        ts = _try_parse_iso(r.first_sold_at)
+    for contact_id, first_sold_at in _conn.execute(
+        "SELECT contact_id, MIN(sold_at) AS first_sold_at FROM sales GROUP BY contact_id"
+    ):
+        ts = _try_parse_iso(first_sold_at)
         if ts:
-            first_sold[cid] = ts
+            first_sold[int(contact_id)] = ts
 
     contacted_like = {
         "Contacted",
@@ -1598,14 +2322,13 @@ def get_conversion_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
         "Irrelevant",
     }
     contacted_set = set(first_contacted.keys())
-    for r in df_contacts.itertuples(index=False):
-        cid = int(r.id)
-        stt = (r.status or "New").strip()
+    for cid, status in contact_rows:
+        stt = (status or "New").strip()
         if stt in contacted_like:
-            contacted_set.add(cid)
+            contacted_set.add(int(cid))
 
     won_set = set(first_sold.keys())
-    won_set |= set(int(r.id) for r in df_contacts.itertuples(index=False) if (r.status or "").strip() == "Won")
+    won_set |= set(int(cid) for cid, status in contact_rows if (status or "").strip() == "Won")
 
     contacted_count = len(contacted_set)
     won_count = len(won_set)
@@ -1630,9 +2353,24 @@ def get_conversion_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
 # -------------------------------------------------------------
 # TOP COUNTERS (torches + revenue)
 # -------------------------------------------------------------
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sold_summary(_conn: sqlite3.Connection) -> Tuple[int, List[str]]:
+    # scalar + tiny list: plain cursor reads, no DataFrame round trip
+    total_qty = int(_conn.execute("SELECT COALESCE(SUM(qty),0) FROM sales").fetchone()[0] or 0)
+    rows = _conn.execute(
+        """
+        SELECT DISTINCT TRIM(c.company) AS company
+        FROM sales s
+        JOIN contacts c ON c.id = s.contact_id
+        WHERE c.company IS NOT NULL AND TRIM(c.company) <> ''
+        ORDER BY company
+        """
+    ).fetchall()
+    return total_qty, [r[0] for r in rows]
+
+
 def show_sales_counters(conn: sqlite3.Connection):
-    df_qty = pd.read_sql_query("SELECT COALESCE(SUM(qty),0) AS q FROM sales", conn)
-    total_qty = int(pd.to_numeric(df_qty.iloc[0]["q"], errors="coerce") or 0) if not df_qty.empty else 0
+    total_qty, companies = get_sold_summary(conn)
 
     yearly = get_sales_yearly_totals(conn)
     year_map = {int(r.year): float(r.revenue_usd) for r in yearly.itertuples(index=False)} if not yearly.empty else {}
@@ -1641,18 +2379,6 @@ def show_sales_counters(conn: sqlite3.Connection):
     start_year = 2025
     years = list(range(start_year, current_year + 1))
 
-    df_companies = pd.read_sql_query(
-        """
-        SELECT DISTINCT TRIM(c.company) AS company
-        FROM sales s
-        JOIN contacts c ON c.id = s.contact_id
-        WHERE c.company IS NOT NULL AND TRIM(c.company) <> ''
-        ORDER BY company
-        """,
-        conn,
-    )
-    companies = df_companies["company"].dropna().tolist() if not df_companies.empty else []
-
     lines = []
     for y in years[-3:]:
         rev = year_map.get(y, 0.0)
@@ -1706,14 +2432,10 @@ def show_dashboard_strip(conn: sqlite3.Connection):
 # -------------------------------------------------------------
 # OVERVIEW LISTS (HTML)
 # -------------------------------------------------------------
-def _render_lead_list(title_html: str, df: pd.DataFrame):
-    st.markdown(title_html, unsafe_allow_html=True)
-    if df.empty:
-        st.caption("No leads in this group.")
-        return
-
+def _lead_list_html(df: pd.DataFrame) -> str:
     rows_html = []
-    for _, sub in df.iterrows():
+    # plain dicts: iterrows would build a Series per row only to .get() a few fields
+    for sub in df.to_dict("records"):
         first = (sub.get("first_name") or "").strip()
         last = (sub.get("last_name") or "").strip()
         lead = f"{first} {last}".strip() or "—"
@@ -1766,52 +2488,91 @@ def _render_lead_list(title_html: str, df: pd.DataFrame):
         """
         )
 
-    block = f"<div style='font-family:system-ui, -apple-system, Segoe UI, Roboto, Arial;'>{''.join(rows_html)}</div>"
-    est_height = min(1200, 54 * len(df) + 60)
+    return f"<div style='font-family:system-ui, -apple-system, Segoe UI, Roboto, Arial;'>{''.join(rows_html)}</div>"
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_overview_lead_lists(_conn: sqlite3.Connection) -> Dict[str, Tuple[int, str]]:
+    # bucket -> (lead count, rendered list); built once per data change, not per rerun
+    df = get_overview_contacts(_conn)
+    lists = {}
+    for bucket in OVERVIEW_BUCKETS:
+        sub = df[df["bucket"] == bucket]
+        lists[bucket] = (len(sub), _lead_list_html(sub) if len(sub) else "")
+    return lists
+
+
+def _render_lead_list(title_html: str, n: int, block: str):
+    st.markdown(title_html, unsafe_allow_html=True)
+    if not n:
+        st.caption("No leads in this group.")
+        return
+    est_height = min(1200, 54 * n + 60)
     components.html(block, height=est_height, scrolling=True)
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def get_overview_contacts(_conn: sqlite3.Connection) -> pd.DataFrame:
+    # status cleanup, bucketing and picker labels happen in SQLite; the picker needs every row
+    cases = " ".join(f"WHEN ? THEN '{b}'" for b, stats in OVERVIEW_BUCKETS.items() for _ in stats)
+    return pd.read_sql_query(
+        f"""
+        SELECT id, first_name, last_name, company, email, status, owner, profile_url, country,
+               product_interest, application,
+               CASE status {cases} END AS bucket,
+               COALESCE(first_name, '') || ' ' || COALESCE(last_name, '') || ' — ' || COALESCE(company, '')
+                 || ' (' || COALESCE(email, '') || ')' AS label
+        FROM (
+          SELECT id, first_name, last_name, company, email,
+                 TRIM(COALESCE(status, 'New'), ' ' || char(9, 10, 13)) AS status,
+                 owner, profile_url, country, product_interest, application
+          FROM contacts
+        )
+        """,
+        _conn,
+        params=[status for stats in OVERVIEW_BUCKETS.values() for status in stats],
+    )
+
+
+@st.fragment
 def show_priority_lists(conn: sqlite3.Connection):
+    # fragment: picking a lead/status and moving it rerun only this tab; the move clears the data
+    # caches, so the contacts table and sidebar show the new status on their next rerun
     st.subheader("Customer overview")
 
     # dashboard strip ON TOP of overview
     show_dashboard_strip(conn)
     st.markdown("---")
 
-    df_all = pd.read_sql_query(
-        "SELECT id, first_name, last_name, company, email, status, owner, profile_url, country, product_interest, application FROM contacts",
-        conn,
-    )
+    df_all = get_overview_contacts(conn)
     if df_all.empty:
         st.caption("No contacts yet – add someone manually or import a file.")
         return
 
-    df_all["status"] = df_all["status"].fillna("New").astype(str).str.strip()
-
     st.caption("⚡ Quick move lead between buckets")
-    options = {
-        int(r.id): f"{(r.first_name or '')} {(r.last_name or '')} — {r.company or ''} ({r.email or ''})"
-        for r in df_all.itertuples(index=False)
-    }
+    options = dict(zip(df_all["id"].tolist(), df_all["label"].tolist()))
 
     q1, q2, q3 = st.columns([2.6, 1.2, 1.2])
     with q1:
         picked = st.selectbox("Pick lead", list(options.keys()), format_func=lambda cid: options.get(cid, str(cid)))
     with q2:
-        new_status = st.selectbox("New status", PIPELINE, index=PIPELINE.index("New") if "New" in PIPELINE else 0)
+        new_status = st.selectbox("New status", PIPELINE, index=PIPELINE_IDX.get("New", 0))
     with q3:
         st.write("")
         st.write("")
         if st.button("Move / Update status", use_container_width=True):
             update_contact_status(conn, int(picked), str(new_status))
             st.success("Updated.")
-            st.rerun()
+            try:
+                st.rerun(scope="fragment")
+            except StreamlitAPIException:
+                # the click landed in a full-app run (fragment reruns are only scoped on their own)
+                st.rerun()
 
     st.markdown("---")
 
-    hot_raw = df_all[df_all["status"].isin(["Quoted", "Meeting"])].copy()
-    pot_raw = df_all[df_all["status"].isin(["New", "Contacted"])].copy()
-    cold_raw = df_all[df_all["status"].isin(["Pending", "On hold", "Irrelevant"])].copy()
+    lists = get_overview_lead_lists(conn)
+    n_hot, n_pot, n_cold = lists["hot"][0], lists["pot"][0], lists["cold"][0]
 
     col1, col2, col3 = st.columns(3)
 
@@ -1819,28 +2580,28 @@ def show_priority_lists(conn: sqlite3.Connection):
         hot_header = f"""
             <div style="background-color:#ff6b6b;padding:6px 10px;border-radius:10px;
                         font-weight:700;color:white;text-align:center;margin-bottom:6px;">
-                🔥 Hot customers ({len(hot_raw)}) — Quoted / Meeting
+                🔥 Hot customers ({n_hot}) — Quoted / Meeting
             </div>
         """
-        _render_lead_list(hot_header, hot_raw)
+        _render_lead_list(hot_header, *lists["hot"])
 
     with col2:
         pot_header = f"""
             <div style="background-color:#28a745;padding:6px 10px;border-radius:10px;
                         font-weight:700;color:white;text-align:center;margin-bottom:6px;">
-                🌱 Potential customers ({len(pot_raw)}) — New / Contacted
+                🌱 Potential customers ({n_pot}) — New / Contacted
             </div>
         """
-        _render_lead_list(pot_header, pot_raw)
+        _render_lead_list(pot_header, *lists["pot"])
 
     with col3:
         cold_header = f"""
             <div style="background-color:#007bff;padding:6px 10px;border-radius:10px;
                         font-weight:700;color:white;text-align:center;margin-bottom:6px;">
-                ❄️ Cold customers ({len(cold_raw)}) — Pending / On hold / Irrelevant
+                ❄️ Cold customers ({n_cold}) — Pending / On hold / Irrelevant
             </div>
         """
-        _render_lead_list(cold_header, cold_raw)
+        _render_lead_list(cold_header, *lists["cold"])
 
 
 # -------------------------------------------------------------
@@ -1855,19 +2616,36 @@ def sidebar_import_export(conn: sqlite3.Connection):
         st.rerun()
 
     up = st.sidebar.file_uploader("Upload Excel/CSV (Contacts)", type=["xlsx", "xls", "csv"])
-    if up is not None:
-        df = load_contacts_file(up)
-        n = upsert_contacts(conn, df)
-        st.sidebar.success(f"Imported/updated {n} contacts")
-        st.rerun()
+    # the uploader keeps its file across reruns; import each upload once
+    if up is not None and st.session_state.get("imported_upload") != up.file_id:
+        bar = st.sidebar.progress(0.0, text="Importing…")
+        n = 0
+        failed = False
+        for chunk in load_contacts_file(up):
+            saved = upsert_contacts(conn, chunk)
+            if saved is None:
+                # chunks commit one by one: stop here rather than import around the gap
+                failed = True
+                break
+            n += saved
+            bar.progress(min(up.tell() / max(up.size, 1), 1.0), text="Importing…")
+        bar.empty()
+        st.session_state["imported_upload"] = up.file_id
+        if failed:
+            # no rerun, so the error stays on screen
+            st.sidebar.warning(f"Import stopped at a failed chunk; {n} contacts imported/updated before it")
+        else:
+            st.sidebar.success(f"Imported/updated {n} contacts")
+            st.rerun()
 
-    total = pd.read_sql_query("SELECT COUNT(*) n FROM contacts", conn).iloc[0]["n"]
-    st.sidebar.caption(f"Total contacts: **{int(total)}**")
+    total = count_contacts(conn, "", [], [], "", [], [])  # unfiltered; cached until the next write
+    st.sidebar.caption(f"Total contacts: **{total}**")
 
-    export_df = st.session_state.get("export_df")
-    if isinstance(export_df, pd.DataFrame) and not export_df.empty:
-        csv_bytes = export_df.to_csv(index=False, quoting=csv.QUOTE_ALL).encode("utf-8")
-        st.sidebar.download_button("Download Contacts CSV (filtered)", csv_bytes, file_name="radom-contacts.csv")
+    export_filters = st.session_state.get("export_filters")
+    if export_filters is not None:
+        csv_bytes = get_export_csv_bytes(conn, export_filters)
+        if csv_bytes:
+            st.sidebar.download_button("Download Contacts CSV (filtered)", csv_bytes, file_name="radom-contacts.csv")
 
 
 # -------------------------------------------------------------
@@ -1879,7 +2657,7 @@ def filters_ui():
 
     c1, c2, c3 = st.columns(3)
     with c1:
-        cats = st.multiselect("Category", ["PhD/Student", "Professor/Academic", "Academic", "Industry", "Other"], [])
+        cats = st.multiselect("Category", CATEGORIES, [])
     with c2:
         stats = st.multiselect("Status", PIPELINE, [])
     with c3:
@@ -1901,18 +2679,11 @@ def build_export_df(conn: sqlite3.Connection, base_df: pd.DataFrame) -> pd.DataF
     if base_df.empty:
         return base_df
 
-    notes = get_notes_agg(conn)
     sales = get_sales_agg(conn)
 
     out = base_df.copy()
     out["id"] = safe_int_series(out["id"], 0)
 
-    if not notes.empty:
-        notes["contact_id"] = safe_int_series(notes["contact_id"], 0)
-        out = out.merge(notes, left_on="id", right_on="contact_id", how="left").drop(columns=["contact_id"])
-    else:
-        out["notes"] = ""
-
     if not sales.empty:
         sales["contact_id"] = safe_int_series(sales["contact_id"], 0)
         out = out.merge(sales, left_on="id", right_on="contact_id", how="left").drop(columns=["contact_id"])
@@ -1931,10 +2702,23 @@ def build_export_df(conn: sqlite3.Connection, base_df: pd.DataFrame) -> pd.DataF
     return out.fillna("")
 
 
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def get_export_csv_bytes(_conn: sqlite3.Connection, filters: Tuple[Any, ...]) -> bytes:
+    """
+    Builds the filtered export on demand from the filter values kept in session_state,
+    instead of holding a copy of the export DataFrame between reruns.
+    Cached per filter tuple until the next write (see clear_data_caches).
+    """
+    export_df = build_export_df(_conn, query_contacts(_conn, *filters))
+    if export_df.empty:
+        return b""
+    return export_df.to_csv(index=False, quoting=csv.QUOTE_ALL).encode("utf-8")
+
+
 # -------------------------------------------------------------
 # CONTACT EDITOR
 # -------------------------------------------------------------
-def contact_editor(conn: sqlite3.Connection, row: pd.Series):
+def contact_editor(conn: sqlite3.Connection, row: Dict[str, Any]):
     st.markdown("---")
     contact_id = int(row["id"])
 
@@ -1962,7 +2746,7 @@ def contact_editor(conn: sqlite3.Connection, row: pd.Series):
         owner = st.selectbox(
             "Owner",
             OWNERS,
-            index=OWNERS.index(row.get("owner") or "") if (row.get("owner") or "") in OWNERS else 0,
+            index=OWNERS_IDX.get(row.get("owner") or "", 0),
             key=f"ow_{contact_id}",
         )
 
@@ -1971,27 +2755,21 @@ def contact_editor(conn: sqlite3.Connection, row: pd.Series):
         status = st.selectbox(
             "Status",
             PIPELINE,
-            index=PIPELINE.index((row.get("status") or "New"))
-            if (row.get("status") or "New") in PIPELINE
-            else 0,
+            index=PIPELINE_IDX.get(row.get("status") or "New", 0),
             key=f"st_{contact_id}",
         )
         gender = st.text_input("Gender", value=str(row.get("gender") or ""), key=f"ge_{contact_id}")
     with c5:
         application = st.selectbox(
             "Application",
-            [""] + APPLICATIONS,
-            index=([""] + APPLICATIONS).index(row.get("application") or "")
-            if (row.get("application") or "") in ([""] + APPLICATIONS)
-            else 0,
+            APPLICATION_OPTIONS,
+            index=APPLICATION_OPTIONS_IDX.get(row.get("application") or "", 0),
             key=f"ap_{contact_id}",
         )
         product_interest = st.selectbox(
             "Product interest",
-            [""] + PRODUCTS,
-            index=([""] + PRODUCTS).index(row.get("product_interest") or "")
-            if (row.get("product_interest") or "") in ([""] + PRODUCTS)
-            else 0,
+            PRODUCT_OPTIONS,
+            index=PRODUCT_OPTIONS_IDX.get(row.get("product_interest") or "", 0),
             key=f"pi_{contact_id}",
         )
     with c6:
@@ -2010,58 +2788,59 @@ def contact_editor(conn: sqlite3.Connection, row: pd.Series):
         if st.button("💾 Save contact", key=f"save_{contact_id}"):
             current_status = (row.get("status") or "New").strip()
             new_status = (status or "New").strip()
-            if current_status != new_status:
-                update_contact_status(conn, contact_id, new_status)
 
-            conn.execute(
-                """
-                UPDATE contacts SET
-                  first_name=?,
-                  last_name=?,
-                  job_title=?,
-                  company=?,
-                  street=?,
-                  street2=?,
-                  zip_code=?,
-                  city=?,
-                  state=?,
-                  country=?,
-                  phone=?,
-                  email=?,
-                  website=?,
-                  owner=?,
-                  gender=?,
-                  application=?,
-                  product_interest=?,
-                  profile_url=?,
-                  dedupe_key=?
-                WHERE id=?
-                """,
-                (
-                    first_name.strip() or None,
-                    last_name.strip() or None,
-                    job_title.strip() or None,
-                    company.strip() or None,
-                    addr1.strip() or None,
-                    addr2.strip() or None,
-                    zip_code.strip() or None,
-                    city.strip() or None,
-                    state.strip() or None,
-                    country.strip() or None,
-                    phone.strip() or None,
-                    _norm_email(email) or None,
-                    _clean_url(website) or None,
-                    owner.strip() or None,
-                    gender.strip() or None,
-                    normalize_application(application) if application else None,
-                    product_interest.strip() or None,
-                    _clean_url(profile_url) or None,
-                    dedupe_key or None,
-                    contact_id,
-                ),
-            )
-            conn.commit()
-            backup_contacts(conn)
+            with write_txn(conn):
+                if current_status != new_status:
+                    _apply_status_change(conn, contact_id, current_status, new_status)
+                conn.execute(
+                    """
+                    UPDATE contacts SET
+                      first_name=?,
+                      last_name=?,
+                      job_title=?,
+                      company=?,
+                      street=?,
+                      street2=?,
+                      zip_code=?,
+                      city=?,
+                      state=?,
+                      country=?,
+                      phone=?,
+                      email=?,
+                      website=?,
+                      owner=?,
+                      gender=?,
+                      application=?,
+                      product_interest=?,
+                      profile_url=?,
+                      dedupe_key=?
+                    WHERE id=?
+                    """,
+                    (
+                        first_name.strip() or None,
+                        last_name.strip() or None,
+                        job_title.strip() or None,
+                        company.strip() or None,
+                        addr1.strip() or None,
+                        addr2.strip() or None,
+                        zip_code.strip() or None,
+                        city.strip() or None,
+                        state.strip() or None,
+                        country.strip() or None,
+                        phone.strip() or None,
+                        _norm_email(email) or None,
+                        _clean_url(website) or None,
+                        owner.strip() or None,
+                        gender.strip() or None,
+                        normalize_application(application) if application else None,
+                        product_interest.strip() or None,
+                        _clean_url(profile_url) or None,
+                        dedupe_key or None,
+                        contact_id,
+                    ),
+                )
+            clear_data_caches()
+            backup_contacts()
             ensure_dedupe_index(conn)
             st.success("Saved.")
             st.rerun()
@@ -2070,7 +2849,8 @@ def contact_editor(conn: sqlite3.Connection, row: pd.Series):
         if st.button("🗑️ Delete contact", key=f"del_{contact_id}"):
             conn.execute("DELETE FROM contacts WHERE id=?", (contact_id,))
             conn.commit()
-            backup_contacts(conn)
+            clear_data_caches()
+            backup_contacts()
             st.warning("Deleted.")
             st.rerun()
 
@@ -2088,13 +2868,17 @@ def contact_editor(conn: sqlite3.Connection, row: pd.Series):
     if st.button("➕ Add note", key=f"add_note_{contact_id}"):
         body = sanitize_note_text(new_note, trim_email_threads=False)
         if body:
-            ts_iso = datetime.utcnow().isoformat()
-            conn.execute(
-                "INSERT INTO notes(contact_id, ts, body, next_followup) VALUES (?,?,?,?)",
-                (contact_id, ts_iso, body, next_followup.strip() or None),
-            )
-            conn.commit()
-            backup_contacts(conn)
+            now = datetime.now(timezone.utc)
+            with write_txn(conn):
+                conn.execute(
+                    "INSERT INTO notes(contact_id, ts, body, next_followup) VALUES (?,?,?,?)",
+                    (contact_id, int(now.timestamp() * 1000), body, next_followup.strip() or None),
+                )
+                conn.execute(
+                    "UPDATE contacts SET last_touch=? WHERE id=?", (now.replace(tzinfo=None).isoformat(), contact_id)
+                )
+            clear_data_caches()
+            backup_contacts()
             st.success("Note added.")
             st.rerun()
         else:
@@ -2200,9 +2984,7 @@ def main():
     inject_christmas_background()
 
     conn = get_conn()
-    init_db(conn)
-    restore_from_backup_if_empty(conn)
-    ensure_dedupe_index(conn)
+    prepare_db(conn)
 
     check_login_two_factor_telegram()
 
@@ -2217,61 +2999,60 @@ def main():
 
     with tab_contacts:
         q, cats, stats, st_like, app_filter, prod_filter = filters_ui()
-        df = query_contacts(conn, q, cats, stats, st_like, app_filter, prod_filter)
+        total = count_contacts(conn, q, cats, stats, st_like, app_filter, prod_filter)
 
-        st.caption(f"Filtered results: **{len(df)}**")
+        st.caption(f"Filtered results: **{total}**")
 
-        export_df = build_export_df(conn, df)
-        st.session_state["export_df"] = export_df
+        st.session_state["export_filters"] = (
+            q,
+            tuple(cats),
+            tuple(stats),
+            st_like,
+            tuple(app_filter),
+            tuple(prod_filter),
+        )
 
-        if df.empty:
+        if total == 0:
             st.info("No contacts match filters.")
             return
 
-        view = df.copy()
+        pages = max(1, math.ceil(total / PAGE_SIZE))
+        if st.session_state.get("contacts_page", 1) > pages:
+            st.session_state["contacts_page"] = pages
+        page = 1
+        if pages > 1:
+            page = int(st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="contacts_page"))
+        df = query_contacts_list(
+            conn,
+            q,
+            cats,
+            stats,
+            st_like,
+            app_filter,
+            prod_filter,
+            limit=PAGE_SIZE,
+            offset=(page - 1) * PAGE_SIZE,
+        )
+
+        view = df[CONTACT_LIST_COLS + ["last_note_ts"]].copy()
         view["id"] = safe_int_series(view["id"], 0)
-        for c in [
-            "first_name",
-            "last_name",
-            "company",
-            "email",
-            "status",
-            "owner",
-            "application",
-            "product_interest",
-            "last_note_ts",
-        ]:
-            if c not in view.columns:
-                view[c] = ""
-        view = view[
-            [
-                "id",
-                "first_name",
-                "last_name",
-                "company",
-                "email",
-                "status",
-                "owner",
-                "application",
-                "product_interest",
-                "last_note_ts",
-            ]
-        ].fillna("")
+        view["last_note_ts"] = ms_series_to_text(view["last_note_ts"], "%Y-%m-%d %H:%M")
+        view = view.fillna("")
 
         st.dataframe(view, use_container_width=True, hide_index=True)
 
-        options = {
-            int(r.id): f"{(r.first_name or '')} {(r.last_name or '')} — {r.company or ''} ({r.email or ''})"
-            for r in df.itertuples(index=False)
-        }
+        lab = df[["first_name", "last_name", "company", "email"]].fillna("").astype(str)
+        labels = lab["first_name"] + " " + lab["last_name"] + " — " + lab["company"] + " (" + lab["email"] + ")"
+        options = dict(zip(view["id"].tolist(), labels.tolist()))
         picked = st.selectbox(
             "Select contact to edit",
             list(options.keys()),
             format_func=lambda cid: options.get(cid, str(cid)),
         )
 
-        row = df[df["id"] == picked].iloc[0]
-        contact_editor(conn, row)
+        row = get_contact(conn, picked)
+        if row is not None:
+            contact_editor(conn, row)
 
     with tab_dashboard:
         dashboard(conn)